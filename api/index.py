@@ -1,3 +1,43 @@
-from app import app
+"""
+Vercel 入口文件
+记录导入 app 的耗时，超出预算或提前加载了重量级模块时输出警告；
+直接运行本文件可作为冷启动检查（不达标时返回非零退出码）
+"""
+import os
+import sys
+import time
 
-# Vercel 需要这个入口文件
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_start = time.perf_counter()
+from app import app, HEAVY_MODULES, IMPORT_BUDGET_MS
+IMPORT_TIME_MS = (time.perf_counter() - _start) * 1000
+
+
+def check_import_budget(budget_ms: float = IMPORT_BUDGET_MS) -> bool:
+    """
+    检查导入耗时和重量级模块是否被提前加载
+
+    Args:
+        budget_ms: 导入耗时预算（毫秒）
+
+    Returns:
+        是否达标
+    """
+    eager = [name for name in HEAVY_MODULES if name in sys.modules]
+
+    if eager:
+        print(f"警告: 启动时已加载重量级模块: {', '.join(eager)}")
+    if IMPORT_TIME_MS > budget_ms:
+        print(f"警告: 导入 app 耗时 {IMPORT_TIME_MS:.0f}ms，超出预算 {budget_ms:.0f}ms")
+
+    return not eager and IMPORT_TIME_MS <= budget_ms
+
+
+if __name__ == '__main__':
+    ok = check_import_budget()
+    print(f"导入 app 耗时 {IMPORT_TIME_MS:.0f}ms（预算 {IMPORT_BUDGET_MS:.0f}ms）")
+    sys.exit(0 if ok else 1)
+else:
+    # Vercel 需要这个入口文件
+    check_import_budget()
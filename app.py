@@ -2,16 +2,24 @@
 Excel拆分工具 - Web界面
 提供文件上传、拆分配置和下载功能
 """
-from flask import Flask, render_template, request, send_file, jsonify, send_from_directory
+from flask import Flask, render_template, request, send_file, jsonify, send_from_directory, Response
 import os
-import shutil
+import re
+import json
+import time
+import threading
 from pathlib import Path
 from werkzeug.utils import secure_filename
-from excel_splitter import ExcelSplitter
-from excel_merger import ExcelMerger
+from job_workspace import JobWorkspace, new_job_id, unique_filename, cleanup_orphans, progress_file_path
+from progress import ProgressReporter, ProgressFile, TERMINAL_EVENTS
 import zipfile
-from datetime import datetime
-import pandas as pd
+
+# pandas、openpyxl 等数据处理模块导入较慢，只在处理数据的接口中按需导入，
+# 这样仅访问页面的请求（以及 Serverless 冷启动）不需要加载它们
+HEAVY_MODULES = ('pandas', 'openpyxl', 'pyarrow')
+
+# 导入 app 的耗时预算（毫秒），由 api/index.py 检查
+IMPORT_BUDGET_MS = float(os.environ.get('IMPORT_BUDGET_MS', 250))
 
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB最大文件大小
@@ -22,14 +30,95 @@ app.config['OUTPUT_FOLDER'] = 'outputs'
 Path(app.config['UPLOAD_FOLDER']).mkdir(parents=True, exist_ok=True)
 Path(app.config['OUTPUT_FOLDER']).mkdir(parents=True, exist_ok=True)
 
+# 清理上次异常退出遗留的任务临时目录
+cleanup_orphans(app.config['OUTPUT_FOLDER'])
+
 ALLOWED_EXTENSIONS = {'xlsx', 'xls'}
 
+# 进度ID由前端生成，只允许安全字符
+PROGRESS_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+PROGRESS_POLL_INTERVAL = 0.3
+PROGRESS_TIMEOUT = 60 * 60
+# 定期发送注释行，客户端断开后下一次写入即可发现，不必等到超时
+PROGRESS_KEEPALIVE = 5
+# 前端先连接进度流再发起任务，超过该时间仍没有进度文件说明任务没有开始
+PROGRESS_START_GRACE = 15
+
 
 def allowed_file(filename):
     """检查文件扩展名是否允许"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def get_sheet_selection(data):
+    """
+    从请求参数中读取Sheet筛选条件（名称或通配符列表）
+    
+    单个字符串视为只有一个条件；其他类型抛出 ValueError
+    （否则字符串会被逐个字符匹配，"明细*" 中的 "*" 会选中所有Sheet）
+    """
+    selection = {}
+    for key in ('include_sheets', 'exclude_sheets'):
+        patterns = data.get(key) or None
+        if isinstance(patterns, str):
+            patterns = [patterns]
+        if patterns is not None and not (
+                isinstance(patterns, list) and all(isinstance(p, str) for p in patterns)):
+            raise ValueError(f"{key} 必须是字符串列表")
+        selection[key] = patterns
+    return selection
+
+
+def get_progress_file(progress_id):
+    """根据进度ID获取进度文件，ID无效时返回 None"""
+    if not progress_id or not PROGRESS_ID_PATTERN.match(progress_id):
+        return None
+    return ProgressFile(progress_file_path(app.config['OUTPUT_FOLDER'], progress_id))
+
+
+def start_job(data):
+    """
+    获取任务的进度文件并上报开始事件，同时清理其他任务遗留的临时目录和进度文件
+    
+    Returns:
+        进度回调，请求未提供有效进度ID时为 None
+    """
+    cleanup_orphans(app.config['OUTPUT_FOLDER'])
+    progress_file = get_progress_file(data.get('progress_id'))
+    ProgressReporter(progress_file).emit('started')
+    return progress_file
+
+
+def job_error(progress_file, message, status=400):
+    """返回错误响应，并通知正在监听进度的前端任务已结束"""
+    if progress_file:
+        progress_file({'event': 'error', 'message': message})
+    return jsonify({'error': message}), status
+
+
+def warm_up(background: bool = True):
+    """
+    预加载数据处理模块，使第一个数据请求不必等待导入
+    
+    Args:
+        background: 是否在后台线程中加载（不阻塞启动）
+    """
+    def load():
+        import excel_splitter
+        import excel_merger
+        import sheet_store
+    
+    if background:
+        threading.Thread(target=load, name='warm-up', daemon=True).start()
+    else:
+        load()
+
+
+# 设置 WARM_UP=1 时启动后在后台预加载
+if os.environ.get('WARM_UP') == '1':
+    warm_up()
+
+
 @app.route('/')
 def index():
     """主页"""
@@ -57,24 +146,23 @@ def upload_file():
         return jsonify({'error': '只支持 .xlsx 和 .xls 文件'}), 400
     
     # 保存文件
-    filename = secure_filename(file.filename)
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    unique_filename = f"{timestamp}_{filename}"
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
+    filename = unique_filename(secure_filename(file.filename))
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
     file.save(filepath)
     
-    # 读取sheet和列信息
+    # 读取sheet和列信息（第一个sheet同时写入列式缓存）
+    from sheet_store import open_workbook, remove_sidecar
+    
     try:
-        import pandas as pd
-        excel_file = pd.ExcelFile(filepath)
-        sheets = excel_file.sheet_names
-        
-        # 读取第一个sheet的列名
-        df = pd.read_excel(filepath, sheet_name=sheets[0])
-        columns = df.columns.tolist()
+        with open_workbook(filepath) as excel_file:
+            sheets = excel_file.sheet_names
+            
+            # 读取第一个sheet的列名
+            df = excel_file.parse(sheets[0])
+            columns = df.columns.tolist()
         
         return jsonify({
-            'filename': unique_filename,
+            'filename': filename,
             'sheets': sheets,
             'columns': columns
         })
@@ -82,6 +170,7 @@ def upload_file():
         # 清理上传的文件
         if os.path.exists(filepath):
             os.remove(filepath)
+        remove_sidecar(filepath)
         return jsonify({'error': f'读取Excel文件失败: {str(e)}'}), 400
 
 
@@ -100,10 +189,21 @@ def preview_split():
     if not os.path.exists(filepath):
         return jsonify({'error': '文件不存在'}), 404
     
+    # 可选的抽样模式：每个sheet只统计前 sample_rows 行并按比例估算
+    sample_rows = data.get('sample_rows')
+    if sample_rows is not None:
+        if isinstance(sample_rows, bool) or not str(sample_rows).isdigit() or int(sample_rows) <= 0:
+            return jsonify({'error': 'sample_rows 必须是正整数'}), 400
+        sample_rows = int(sample_rows)
+    
+    from excel_splitter import ExcelSplitter, sort_values
+    
     try:
-        splitter = ExcelSplitter(filepath, split_column, app.config['OUTPUT_FOLDER'])
-        sheets = splitter.read_all_sheets()
-        unique_values = splitter.get_unique_values(sheets)
+        splitter = ExcelSplitter(filepath, split_column, app.config['OUTPUT_FOLDER'],
+                                 **get_sheet_selection(data))
+        # 只读取拆分列，不加载其他列
+        sheet_counts = splitter.count_values(sample_rows)
+        unique_values = sort_values(set().union(*(result['counts'] for result in sheet_counts.values())))
         
         # 统计每个值在各个sheet中的数据量
         preview_data = []
@@ -114,13 +214,11 @@ def preview_split():
             }
             total_rows = 0
             
-            for sheet_name, df in sheets.items():
-                if split_column in df.columns:
-                    filtered_df = df[df[split_column] == value]
-                    row_count = len(filtered_df)
-                    if row_count > 0:
-                        value_data['sheets'][sheet_name] = row_count
-                        total_rows += row_count
+            for sheet_name, result in sheet_counts.items():
+                row_count = result['counts'].get(value, 0)
+                if row_count > 0:
+                    value_data['sheets'][sheet_name] = row_count
+                    total_rows += row_count
             
             value_data['total_rows'] = total_rows
             preview_data.append(value_data)
@@ -128,7 +226,8 @@ def preview_split():
         return jsonify({
             'preview': preview_data,
             'total_files': len(unique_values),
-            'sheet_names': list(sheets.keys())
+            'sheet_names': list(sheet_counts.keys()),
+            'approximate': any(result['approximate'] for result in sheet_counts.values())
         })
     except Exception as e:
         return jsonify({'error': f'预览失败: {str(e)}'}), 400
@@ -140,47 +239,118 @@ def split_file():
     data = request.json
     filename = data.get('filename')
     split_column = data.get('split_column')
+    progress_file = start_job(data)
     
     if not filename or not split_column:
-        return jsonify({'error': '缺少必要参数'}), 400
+        return job_error(progress_file, '缺少必要参数')
     
     filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
     
     if not os.path.exists(filepath):
-        return jsonify({'error': '文件不存在'}), 404
+        return job_error(progress_file, '文件不存在', 404)
     
-    # 创建唯一的输出目录
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    output_dir = os.path.join(app.config['OUTPUT_FOLDER'], timestamp)
+    from excel_splitter import ExcelSplitter
     
+    # 每个任务使用独立的临时目录，结束后无论成功与否都会被清理
     try:
-        splitter = ExcelSplitter(filepath, split_column, output_dir)
-        output_files = splitter.split_and_save()
-        
-        # 创建ZIP文件
-        zip_filename = f"拆分结果_{timestamp}.zip"
-        zip_path = os.path.join(app.config['OUTPUT_FOLDER'], zip_filename)
-        
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for value, file_path in output_files.items():
-                # 添加文件到ZIP，使用相对路径
-                arcname = os.path.basename(file_path)
-                zipf.write(file_path, arcname)
+        with JobWorkspace(app.config['OUTPUT_FOLDER']) as workspace:
+            splitter = ExcelSplitter(filepath, split_column, workspace.path('files'),
+                                     **get_sheet_selection(data))
+            
+            # 单工作簿模式：所有分组写入同一个xlsx（每组一个Sheet），不需要打包ZIP
+            if data.get('output_mode') == 'workbook':
+                workbook_filename = f"拆分结果_{workspace.job_id}.xlsx"
+                groups = splitter.split_to_workbook(
+                    workspace.path(workbook_filename),
+                    index_sheet=bool(data.get('index_sheet', True)),
+                    progress=progress_file
+                )
+                workspace.publish(workbook_filename, workbook_filename)
+                
+                ProgressReporter(progress_file).emit('done')
+                
+                return jsonify({
+                    'success': True,
+                    'output_mode': 'workbook',
+                    'download_url': f'/download/{workbook_filename}',
+                    'file_count': len(groups),
+                    'files': [str(value) for value in groups]
+                })
+            
+            output_files = splitter.split_and_save(progress_file)
+            
+            # 在临时目录中创建ZIP文件，写完后再原子发布
+            zip_filename = f"拆分结果_{workspace.job_id}.zip"
+            zip_reporter = ProgressReporter(progress_file)
+            total_bytes = sum(os.path.getsize(p) for p in output_files.values())
+            zip_reporter.set_total(total_bytes)
+            
+            with zipfile.ZipFile(workspace.path(zip_filename), 'w', zipfile.ZIP_DEFLATED) as zipf:
+                for value, file_path in output_files.items():
+                    # 添加文件到ZIP，使用相对路径
+                    arcname = os.path.basename(file_path)
+                    zipf.write(file_path, arcname)
+                    size = os.path.getsize(file_path)
+                    zip_reporter.advance(done=size, event='bytes_zipped',
+                                         bytes=zip_reporter.done + size, total_bytes=total_bytes)
+            
+            workspace.publish(zip_filename, zip_filename)
         
-        # 清理临时文件
-        shutil.rmtree(output_dir)
+        zip_reporter.emit('done')
         
         return jsonify({
             'success': True,
             'download_url': f'/download/{zip_filename}',
+            'output_mode': 'files',
             'file_count': len(output_files),
             'files': list(output_files.keys())
         })
     except Exception as e:
-        # 清理可能的临时文件
-        if os.path.exists(output_dir):
-            shutil.rmtree(output_dir)
-        return jsonify({'error': f'拆分失败: {str(e)}'}), 400
+        return job_error(progress_file, f'拆分失败: {str(e)}')
+
+
+@app.route('/progress/<progress_id>')
+def progress_stream(progress_id):
+    """通过 Server-Sent Events 推送拆分/合并进度"""
+    progress_file = get_progress_file(progress_id)
+    if progress_file is None:
+        return jsonify({'error': '无效的进度ID'}), 400
+    
+    def generate():
+        last_event = None
+        started = time.monotonic()
+        last_sent = started
+        deadline = started + PROGRESS_TIMEOUT
+        
+        while time.monotonic() < deadline:
+            event = progress_file.read()
+            now = time.monotonic()
+            
+            if event is None and last_event is None and now - started > PROGRESS_START_GRACE:
+                # 任务没有开始（请求未发出或在写入进度前失败），不再等待
+                return
+            
+            if event and event != last_event:
+                last_event = event
+                last_sent = now
+                yield f"data: {event}\n\n"
+                
+                # 任务结束后删除进度文件并关闭连接
+                try:
+                    finished = json.loads(event).get('event') in TERMINAL_EVENTS
+                except ValueError:
+                    finished = False
+                if finished:
+                    progress_file.remove()
+                    return
+            elif now - last_sent >= PROGRESS_KEEPALIVE:
+                # 客户端已断开时写入会失败，生成器随之结束
+                last_sent = now
+                yield ": keepalive\n\n"
+            time.sleep(PROGRESS_POLL_INTERVAL)
+    
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
 @app.route('/download/<filename>')
@@ -199,6 +369,8 @@ def download_file(filename):
 @app.route('/cleanup', methods=['POST'])
 def cleanup():
     """清理临时文件"""
+    from sheet_store import remove_sidecar
+    
     data = request.json
     filename = data.get('filename')
     
@@ -206,6 +378,7 @@ def cleanup():
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
         if os.path.exists(filepath):
             os.remove(filepath)
+        remove_sidecar(filepath)
     
     return jsonify({'success': True})
 
@@ -224,11 +397,13 @@ def upload_multiple_files():
     if len(files) < 2:
         return jsonify({'error': '至少需要上传2个文件进行合并'}), 400
     
+    from sheet_store import open_workbook, remove_sidecar
+    
     uploaded_files = []
     all_sheets = set()
     
     try:
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        job_id = new_job_id()
         
         for idx, file in enumerate(files):
             if file.filename == '':
@@ -239,18 +414,18 @@ def upload_multiple_files():
             
             # 保存文件
             filename = secure_filename(file.filename)
-            unique_filename = f"{timestamp}_{idx}_{filename}"
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
+            saved_name = unique_filename(f"{idx}_{filename}", job_id)
+            filepath = os.path.join(app.config['UPLOAD_FOLDER'], saved_name)
             file.save(filepath)
             
-            # 读取sheet信息
-            excel_file = pd.ExcelFile(filepath)
-            sheets = excel_file.sheet_names
+            # 只读取sheet名称，各sheet在合并时第一次读取才转码
+            with open_workbook(filepath) as excel_file:
+                sheets = excel_file.sheet_names
             all_sheets.update(sheets)
             
             uploaded_files.append({
                 'original_name': file.filename,
-                'saved_name': unique_filename,
+                'saved_name': saved_name,
                 'sheets': sheets
             })
         
@@ -266,6 +441,7 @@ def upload_multiple_files():
             filepath = os.path.join(app.config['UPLOAD_FOLDER'], file_info['saved_name'])
             if os.path.exists(filepath):
                 os.remove(filepath)
+            remove_sidecar(filepath)
         return jsonify({'error': f'上传失败: {str(e)}'}), 400
 
 
@@ -285,8 +461,11 @@ def preview_merge():
             return jsonify({'error': f'文件 {file_info["original_name"]} 不存在'}), 404
         file_paths.append(filepath)
     
+    from excel_merger import ExcelMerger
+    from sheet_store import open_workbook
+    
     try:
-        merger = ExcelMerger(file_paths, "temp.xlsx")
+        merger = ExcelMerger(file_paths, "temp.xlsx", **get_sheet_selection(data))
         sheet_files = merger.get_all_sheets_info()
         
         # 统计每个sheet的数据
@@ -301,7 +480,8 @@ def preview_merge():
             
             for file_path in file_list:
                 try:
-                    df = pd.read_excel(file_path, sheet_name=sheet_name)
+                    with open_workbook(file_path) as excel_file:
+                        df = excel_file.parse(sheet_name)
                     row_count = len(df)
                     sheet_info['total_rows'] += row_count
                     sheet_info['files'].append({
@@ -327,42 +507,54 @@ def merge_files():
     """执行合并"""
     data = request.json
     files = data.get('files', [])
+    progress_file = start_job(data)
     
     if not files or len(files) < 2:
-        return jsonify({'error': '至少需要2个文件进行合并'}), 400
+        return job_error(progress_file, '至少需要2个文件进行合并')
     
     file_paths = []
     for file_info in files:
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], file_info['saved_name'])
         if not os.path.exists(filepath):
-            return jsonify({'error': f'文件 {file_info["original_name"]} 不存在'}), 404
+            return job_error(progress_file, f'文件 {file_info["original_name"]} 不存在', 404)
         file_paths.append(filepath)
     
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    output_filename = f"合并结果_{timestamp}.xlsx"
-    output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
+    from excel_merger import ExcelMerger
     
     try:
-        merger = ExcelMerger(file_paths, output_path)
-        result_stats = merger.merge_and_save()
+        with JobWorkspace(app.config['OUTPUT_FOLDER']) as workspace:
+            output_filename = f"合并结果_{workspace.job_id}.xlsx"
+            # 设置 join_column 时按关键列横向合并（join_how: inner / left / outer）
+            merger = ExcelMerger(file_paths, workspace.path(output_filename),
+                                 join_column=data.get('join_column') or None,
+                                 join_how=data.get('join_how') or 'left',
+                                 **get_sheet_selection(data))
+            result_stats = merger.merge_and_save(progress_file)
+            workspace.publish(output_filename, output_filename)
+        
+        if progress_file:
+            progress_file({'event': 'done', 'progress': 1.0})
         
         return jsonify({
             'success': True,
             'download_url': f'/download/{output_filename}',
             'sheet_count': len(result_stats),
-            'stats': result_stats
+            'stats': result_stats,
+            'duplicate_keys': merger.duplicate_keys,
+            'blank_keys': merger.blank_keys,
+            'skipped_files': merger.skipped_files,
+            'appended_sheets': merger.appended_sheets
         })
         
     except Exception as e:
-        # 清理可能的临时文件
-        if os.path.exists(output_path):
-            os.remove(output_path)
-        return jsonify({'error': f'合并失败: {str(e)}'}), 400
+        return job_error(progress_file, f'合并失败: {str(e)}')
 
 
 @app.route('/cleanup-merge', methods=['POST'])
 def cleanup_merge():
     """清理合并临时文件"""
+    from sheet_store import remove_sidecar
+    
     data = request.json
     files = data.get('files', [])
     
@@ -370,6 +562,7 @@ def cleanup_merge():
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], file_info['saved_name'])
         if os.path.exists(filepath):
             os.remove(filepath)
+        remove_sidecar(filepath)
     
     return jsonify({'success': True})
 
@@ -1,32 +1,77 @@
 """
 Excel文件合并工具
-支持合并多个Excel文件，相同名称的Sheet分别合并，自动去除重复标题行
+支持合并多个Excel文件，相同名称的Sheet分别合并，自动去除重复标题行；
+也支持按关键列横向合并（类似VLOOKUP）
 """
 import pandas as pd
 import os
 from pathlib import Path
-from typing import List, Dict
+from typing import Callable, Iterator, List, Dict, Optional
 import openpyxl
 from collections import defaultdict
+from sheet_selection import select_sheets
+from sheet_store import open_workbook
+from progress import ProgressReporter
+from rolling_writer import RollingSheetWriter
+from xlsx_scanner import sheet_layouts
+
+
+# 按关键列合并时支持的连接方式
+JOIN_HOWS = ('inner', 'left', 'outer')
+
+# 重复关键值报告中最多列出的示例数
+DUPLICATE_EXAMPLES = 5
+
+
+def _key_text(value):
+    # 关键列统一为文本时，整数值的浮点数（含空值的整数列）写成 1 而不是 1.0
+    if pd.isna(value):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
 
 
 class ExcelMerger:
     """Excel文件合并器"""
     
-    def __init__(self, input_files: List[str], output_file: str = "merged.xlsx"):
+    def __init__(self, input_files: List[str], output_file: str = "merged.xlsx",
+                 include_sheets: Optional[List[str]] = None,
+                 exclude_sheets: Optional[List[str]] = None,
+                 join_column: Optional[str] = None, join_how: str = 'left'):
         """
         初始化合并器
         
         Args:
             input_files: 输入的Excel文件路径列表
             output_file: 输出文件路径
+            include_sheets: 只合并这些Sheet（名称或通配符），默认全部
+            exclude_sheets: 跳过这些Sheet（名称或通配符）
+            join_column: 关键列名（如"商务组别"），设置后按该列横向合并，否则纵向追加行
+            join_how: 横向合并的连接方式：inner / left / outer
         """
+        if join_how not in JOIN_HOWS:
+            raise ValueError(f"不支持的连接方式 '{join_how}'，可选: {', '.join(JOIN_HOWS)}")
+        
         self.input_files = input_files
         self.output_file = output_file
+        self.include_sheets = include_sheets
+        self.exclude_sheets = exclude_sheets
+        self.join_column = join_column
+        self.join_how = join_how
+        # 以下为横向合并的报告，merge_and_save 后可用
+        # 各Sheet的重复关键值
+        self.duplicate_keys: Dict[str, List[dict]] = {}
+        # 各Sheet中关键列为空的行（与VLOOKUP一致，空值不参与匹配）
+        self.blank_keys: Dict[str, List[dict]] = {}
+        # 各Sheet中因缺少关键列或关键列无法连接而跳过的文件
+        self.skipped_files: Dict[str, List[dict]] = {}
+        # 所有文件都没有关键列、改为纵向追加的Sheet（如"说明"）
+        self.appended_sheets: List[str] = []
         
     def get_all_sheets_info(self) -> Dict[str, List[str]]:
         """
-        获取所有文件中的Sheet信息
+        获取所有文件中选中的Sheet信息（只读取Sheet名称，不解析数据）
         
         Returns:
             字典，key为sheet名称，value为包含该sheet的文件列表
@@ -35,31 +80,38 @@ class ExcelMerger:
         
         for file_path in self.input_files:
             try:
-                excel_file = pd.ExcelFile(file_path)
-                for sheet_name in excel_file.sheet_names:
+                with open_workbook(file_path) as excel_file:
+                    selected = select_sheets(excel_file.sheet_names,
+                                             self.include_sheets, self.exclude_sheets)
+                for sheet_name in selected:
                     sheet_files[sheet_name].append(file_path)
             except Exception as e:
                 print(f"警告: 读取文件 '{file_path}' 失败: {str(e)}")
         
         return dict(sheet_files)
     
-    def merge_sheets(self, sheet_name: str, file_list: List[str]) -> pd.DataFrame:
+    def iter_sheet_frames(self, sheet_name: str, file_list: List[str],
+                          reporter: Optional[ProgressReporter] = None) -> Iterator[pd.DataFrame]:
         """
-        合并同名Sheet的数据
+        逐个文件读取同名Sheet，按第一个文件的标题行对齐后依次返回
         
         Args:
             sheet_name: Sheet名称
             file_list: 包含该Sheet的文件列表
+            reporter: 进度上报器，每读取一个文件累加一步
             
-        Returns:
-            合并后的DataFrame
+        Yields:
+            对齐后的DataFrame（跳过空数据和读取失败的文件）
         """
-        merged_data = []
         header = None
         
         for idx, file_path in enumerate(file_list):
             try:
-                df = pd.read_excel(file_path, sheet_name=sheet_name)
+                with open_workbook(file_path) as excel_file:
+                    df = excel_file.parse(sheet_name)
+                
+                if reporter:
+                    reporter.advance(rows=len(df), done=1)
                 
                 if df.empty:
                     print(f"  跳过空数据: {os.path.basename(file_path)} - {sheet_name}")
@@ -68,14 +120,14 @@ class ExcelMerger:
                 # 第一个文件，记录标题行
                 if header is None:
                     header = df.columns.tolist()
-                    merged_data.append(df)
+                    yield df
                     print(f"  ✓ {os.path.basename(file_path)}: {len(df)} 行 (包含标题)")
                 else:
                     # 后续文件，检查标题是否一致
                     current_header = df.columns.tolist()
                     if current_header == header:
                         # 标题一致，直接追加数据
-                        merged_data.append(df)
+                        yield df
                         print(f"  ✓ {os.path.basename(file_path)}: {len(df)} 行")
                     else:
                         # 标题不一致，尝试对齐列
@@ -85,11 +137,28 @@ class ExcelMerger:
                         for col in header:
                             if col in df.columns:
                                 aligned_df[col] = df[col].values
-                        merged_data.append(aligned_df)
+                        yield aligned_df
                         print(f"  ✓ 对齐后追加: {len(aligned_df)} 行")
                         
             except Exception as e:
                 print(f"  ✗ 读取失败 {os.path.basename(file_path)} - {sheet_name}: {str(e)}")
+                if reporter:
+                    reporter.advance(done=1)
+    
+    def merge_sheets(self, sheet_name: str, file_list: List[str],
+                     reporter: Optional[ProgressReporter] = None) -> pd.DataFrame:
+        """
+        合并同名Sheet的数据
+        
+        Args:
+            sheet_name: Sheet名称
+            file_list: 包含该Sheet的文件列表
+            reporter: 进度上报器，每读取一个文件累加一步
+            
+        Returns:
+            合并后的DataFrame
+        """
+        merged_data = list(self.iter_sheet_frames(sheet_name, file_list, reporter))
         
         if not merged_data:
             return pd.DataFrame()
@@ -98,45 +167,163 @@ class ExcelMerger:
         result = pd.concat(merged_data, ignore_index=True)
         return result
     
-    def copy_sheet_formatting(self, source_file: str, source_sheet_name: str,
-                            target_wb, target_sheet_name: str):
+    def find_duplicate_keys(self, df: pd.DataFrame) -> Optional[dict]:
         """
-        从源文件复制Sheet格式
+        统计关键列中的重复值（重复值会让连接结果的行数成倍增加）
         
         Args:
-            source_file: 源文件路径
-            source_sheet_name: 源Sheet名称
-            target_wb: 目标工作簿
-            target_sheet_name: 目标Sheet名称
+            df: 包含关键列的DataFrame
+            
+        Returns:
+            {'keys': 重复值个数, 'rows': 涉及行数, 'examples': 示例值}，没有重复时返回 None
         """
-        try:
-            source_wb = openpyxl.load_workbook(source_file)
-            if source_sheet_name not in source_wb.sheetnames:
-                return
-                
-            source_ws = source_wb[source_sheet_name]
-            target_ws = target_wb[target_sheet_name]
+        key = df[self.join_column]
+        duplicated = key[key.duplicated(keep=False)].dropna()
+        if duplicated.empty:
+            return None
+        
+        unique_keys = duplicated.unique()
+        return {
+            'keys': len(unique_keys),
+            'rows': len(duplicated),
+            'examples': [str(value) for value in unique_keys[:DUPLICATE_EXAMPLES]]
+        }
+    
+    def join_sheets(self, sheet_name: str, file_list: List[str],
+                    reporter: Optional[ProgressReporter] = None) -> pd.DataFrame:
+        """
+        按关键列横向合并同名Sheet
+        
+        第一个文件作为左表，依次与后续文件按 join_column 连接；
+        pandas 的 merge 是向量化的哈希连接（对关键列建哈希表后批量探测），
+        后续文件中与左表重名的列加上 _2、_3 等后缀
+        
+        关键列为空的行不参与匹配：left/outer 连接保留左表的这些行，outer 连接还保留右表的这些行；
+        所有文件都没有关键列的Sheet按纵向追加处理
+        
+        Args:
+            sheet_name: Sheet名称
+            file_list: 包含该Sheet的文件列表
+            reporter: 进度上报器，每读取一个文件累加一步
+            
+        Returns:
+            合并后的DataFrame
+        """
+        result = None
+        duplicates = []
+        blanks = []
+        skipped = []
+        unkeyed = []
+        # 关键列为空、需要原样保留的行
+        blank_frames = []
+        
+        for position, file_path in enumerate(file_list, 1):
+            file_name = os.path.basename(file_path)
+            try:
+                with open_workbook(file_path) as excel_file:
+                    df = excel_file.parse(sheet_name)
+            except Exception as e:
+                print(f"  ✗ 读取失败 {file_name} - {sheet_name}: {str(e)}")
+                if reporter:
+                    reporter.advance(done=1)
+                continue
+            
+            if reporter:
+                reporter.advance(rows=len(df), done=1)
+            
+            if self.join_column not in df.columns:
+                print(f"  ⚠ {file_name}: 未找到关键列 '{self.join_column}'，跳过")
+                unkeyed.append((file_name, df))
+                continue
+            
+            blank = df[self.join_column].isna()
+            if blank.any():
+                blanks.append({'file': file_name, 'rows': int(blank.sum())})
+                print(f"  ⚠ {file_name}: 关键列有 {int(blank.sum())} 行为空，不参与匹配")
+                blank_rows = df[blank]
+                df = df[~blank]
+            else:
+                blank_rows = None
+            
+            duplicate = self.find_duplicate_keys(df)
+            if duplicate:
+                duplicate['file'] = file_name
+                duplicates.append(duplicate)
+                print(f"  ⚠ {file_name}: 关键列有 {duplicate['keys']} 个重复值"
+                      f"（如 {', '.join(duplicate['examples'])}）")
             
-            # 复制列宽
-            for col in source_ws.column_dimensions:
-                if col in source_ws.column_dimensions:
-                    target_ws.column_dimensions[col].width = source_ws.column_dimensions[col].width
+            if result is None:
+                result = df
+                if blank_rows is not None and self.join_how != 'inner':
+                    blank_frames.append(blank_rows)
+                print(f"  ✓ {file_name}: {len(df)} 行 (左表)")
+                continue
             
-            # 复制行高（仅第一行标题行）
-            if 1 in source_ws.row_dimensions:
-                target_ws.row_dimensions[1].height = source_ws.row_dimensions[1].height
-                    
-        except Exception as e:
-            print(f"  复制格式时出错: {str(e)}")
+            try:
+                merged = self._merge(result, df, position)
+            except (ValueError, TypeError) as e:
+                print(f"  ✗ 无法连接 {file_name}: {str(e)}")
+                skipped.append({'file': file_name, 'reason': f'关键列无法连接: {str(e)}'})
+                continue
+            
+            if blank_rows is not None and self.join_how == 'outer':
+                # 与 merge 相同的规则：和左表重名的列加后缀
+                blank_frames.append(blank_rows.rename(columns={
+                    col: f'{col}_{position}' for col in blank_rows.columns
+                    if col != self.join_column and col in result.columns
+                }))
+            result = merged
+            print(f"  ✓ 连接 {file_name}: {len(df)} 行，结果 {len(result)} 行")
+        
+        if result is None and unkeyed:
+            # 所有文件都没有关键列，按纵向追加保留该Sheet
+            print(f"  ⚠ 所有文件都没有关键列，改为纵向追加")
+            self.appended_sheets.append(sheet_name)
+            return pd.concat([df for _, df in unkeyed], ignore_index=True)
+        
+        skipped = [{'file': file_name, 'reason': f"未找到关键列 '{self.join_column}'"}
+                   for file_name, _ in unkeyed] + skipped
+        if duplicates:
+            self.duplicate_keys[sheet_name] = duplicates
+        if blanks:
+            self.blank_keys[sheet_name] = blanks
+        if skipped:
+            self.skipped_files[sheet_name] = skipped
+        
+        if result is None:
+            return pd.DataFrame()
+        if blank_frames:
+            result = pd.concat([result, *blank_frames], ignore_index=True)[result.columns]
+        return result
+    
+    def _merge(self, left: pd.DataFrame, right: pd.DataFrame, position: int) -> pd.DataFrame:
+        """按关键列连接两个表，关键列类型不一致（如数字和文本）时统一转为文本后再连接"""
+        def join(left, right):
+            return pd.merge(left, right, how=self.join_how, on=self.join_column,
+                            suffixes=('', f'_{position}'), sort=False)
+        
+        try:
+            return join(left, right)
+        except ValueError:
+            left = left.assign(**{self.join_column: left[self.join_column].map(_key_text)})
+            right = right.assign(**{self.join_column: right[self.join_column].map(_key_text)})
+            return join(left, right)
     
-    def merge_and_save(self) -> Dict[str, int]:
+    def merge_and_save(self, progress: Optional[Callable[[dict], None]] = None) -> Dict[str, int]:
         """
         执行合并并保存文件
         
+        Args:
+            progress: 进度回调，接收事件字典（sheet_started / rows_processed / file_written）
+        
         Returns:
-            字典，key为sheet名称，value为合并后的行数
+            字典，key为输出的sheet名称，value为合并后的行数
+            （超过Excel行数上限的sheet会续写到 名称_2、名称_3 ...，分别统计）
         """
-        print(f"\n开始合并 {len(self.input_files)} 个文件...")
+        if self.join_column:
+            print(f"\n开始按关键列 '{self.join_column}' 合并 {len(self.input_files)} 个文件 ({self.join_how} join)...")
+        else:
+            print(f"\n开始合并 {len(self.input_files)} 个文件...")
         print("=" * 60)
         
         # 获取所有Sheet信息
@@ -147,36 +334,58 @@ class ExcelMerger:
         
         print(f"\n找到 {len(sheet_files)} 个不同的Sheet名称")
         
+        # 进度按步数计算：每个文件的每个Sheet读取一步，每个合并后的Sheet写入一步
+        reporter = ProgressReporter(progress)
+        reporter.set_total(sum(len(file_list) for file_list in sheet_files.values()) + len(sheet_files))
+        
         # 创建Excel写入器
         result_stats = {}
+        self.duplicate_keys = {}
+        self.blank_keys = {}
+        self.skipped_files = {}
+        self.appended_sheets = []
         
-        with pd.ExcelWriter(self.output_file, engine='openpyxl') as writer:
-            for sheet_name, file_list in sorted(sheet_files.items()):
-                print(f"\n正在合并 Sheet: '{sheet_name}' (来自 {len(file_list)} 个文件)")
-                
-                # 合并数据
-                merged_df = self.merge_sheets(sheet_name, file_list)
-                
-                if not merged_df.empty:
-                    # 写入数据
-                    merged_df.to_excel(writer, sheet_name=sheet_name, index=False)
-                    result_stats[sheet_name] = len(merged_df)
-                    
-                    # 尝试复制格式（从第一个包含该sheet的文件）
-                    try:
-                        self.copy_sheet_formatting(
-                            file_list[0], sheet_name,
-                            writer.book, sheet_name
-                        )
-                    except:
-                        pass
-                    
-                    print(f"  ✅ 合并完成: 共 {len(merged_df)} 行数据")
-                else:
-                    print(f"  ⚠ 跳过空Sheet")
+        # write-only 工作簿逐行流式写出，出错时不保存，原始错误直接抛出
+        workbook = openpyxl.Workbook(write_only=True)
+        self._write_sheets(workbook, sheet_files, reporter, result_stats)
+        # write-only 工作簿没有任何Sheet时无法保存
+        if not result_stats:
+            raise ValueError("没有可写入的数据")
+        workbook.save(self.output_file)
+        
+        reporter.emit('file_written', file=os.path.basename(self.output_file))
         
         return result_stats
     
+    def _write_sheets(self, workbook, sheet_files: Dict[str, List[str]],
+                      reporter: ProgressReporter, result_stats: Dict[str, int]):
+        """逐个合并Sheet并写入 workbook，写入的行数记录到 result_stats"""
+        for sheet_name, file_list in sorted(sheet_files.items()):
+            print(f"\n正在合并 Sheet: '{sheet_name}' (来自 {len(file_list)} 个文件)")
+            reporter.emit('sheet_started', sheet=sheet_name)
+            
+            # 格式取自第一个包含该sheet的文件，每个逻辑sheet只读取一次，续写的sheet沿用
+            layout = sheet_layouts(file_list[0], [sheet_name]).get(sheet_name, {})
+            
+            # 边读边写，超过行数上限时自动续写到新的sheet
+            sheet_writer = RollingSheetWriter(workbook, sheet_name, reserved=sheet_files.keys(),
+                                              **layout)
+            if self.join_column:
+                frames = [self.join_sheets(sheet_name, file_list, reporter)]
+            else:
+                frames = self.iter_sheet_frames(sheet_name, file_list, reporter)
+            for df in frames:
+                sheet_writer.append(df)
+            
+            if sheet_writer.total_rows:
+                result_stats.update(sheet_writer.rows)
+                
+                print(f"  ✅ 合并完成: 共 {sheet_writer.total_rows} 行数据")
+            else:
+                print(f"  ⚠ 跳过空Sheet")
+            
+            reporter.advance(done=1)
+    
     def get_summary(self) -> str:
         """
         获取合并摘要信息
@@ -199,6 +408,9 @@ class ExcelMerger:
         for sheet_name, file_list in sorted(sheet_files.items()):
             summary += f"  - {sheet_name}: 出现在 {len(file_list)} 个文件中\n"
         
+        if self.join_column:
+            summary += f"\n合并方式: 按关键列 '{self.join_column}' 横向合并 ({self.join_how} join)\n"
+        
         summary += f"\n输出文件: {self.output_file}\n"
         
         return summary
@@ -211,13 +423,21 @@ def main():
     parser = argparse.ArgumentParser(description='Excel文件合并工具')
     parser.add_argument('input_files', nargs='+', help='输入的Excel文件路径（可多个）')
     parser.add_argument('--output', '-o', default='merged.xlsx', help='输出文件名（默认: merged.xlsx）')
+    parser.add_argument('--include-sheets', nargs='+', help='只合并这些Sheet，支持通配符（如 "明细*"）')
+    parser.add_argument('--exclude-sheets', nargs='+', help='跳过这些Sheet，支持通配符（如 "透视*"）')
+    parser.add_argument('--join-column', '-k', help='按该关键列横向合并（类似VLOOKUP），不设置时纵向追加行')
+    parser.add_argument('--join-how', choices=JOIN_HOWS, default='left', help='横向合并的连接方式（默认: left）')
     
     args = parser.parse_args()
     
     # 创建合并器
     merger = ExcelMerger(
         input_files=args.input_files,
-        output_file=args.output
+        output_file=args.output,
+        include_sheets=args.include_sheets,
+        exclude_sheets=args.exclude_sheets,
+        join_column=args.join_column,
+        join_how=args.join_how
     )
     
     # 显示摘要
@@ -233,6 +453,22 @@ def main():
     print(f"\nSheet统计:")
     for sheet_name, row_count in result_stats.items():
         print(f"  - {sheet_name}: {row_count} 行")
+    
+    if merger.duplicate_keys:
+        print(f"\n⚠ 关键列存在重复值（连接结果可能出现重复行）:")
+        for sheet_name, duplicates in merger.duplicate_keys.items():
+            for duplicate in duplicates:
+                print(f"  - {sheet_name} / {duplicate['file']}: {duplicate['keys']} 个重复值，"
+                      f"涉及 {duplicate['rows']} 行")
+    
+    for sheet_name, blanks in merger.blank_keys.items():
+        for blank in blanks:
+            print(f"  - {sheet_name} / {blank['file']}: 关键列有 {blank['rows']} 行为空，不参与匹配")
+    for sheet_name, skipped in merger.skipped_files.items():
+        for item in skipped:
+            print(f"  - {sheet_name} / {item['file']}: 已跳过（{item['reason']}）")
+    for sheet_name in merger.appended_sheets:
+        print(f"  - {sheet_name}: 所有文件都没有关键列，已按行追加")
 
 
 if __name__ == '__main__':
@@ -3,18 +3,95 @@ Excel文件拆分工具
 支持按指定列拆分Excel文件，保留所有sheet结构
 """
 import pandas as pd
+import numpy as np
 import os
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
+import re
 import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.worksheet.hyperlink import Hyperlink
 from openpyxl.utils.dataframe import dataframe_to_rows
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+from sheet_selection import select_sheets
+from sheet_store import open_workbook
+from progress import ProgressReporter
+from xlsx_scanner import XlsxKeyScanner, ScanUnsupported, sheet_layouts
+from rolling_writer import RollingSheetWriter, SHEET_NAME_MAX_LENGTH
+
+
+# 单工作簿模式下目录sheet的名称
+INDEX_SHEET_NAME = '目录'
+
+# Sheet名称中不允许出现的字符
+INVALID_SHEET_CHARS = re.compile(r'[\[\]:*?/\\]')
+
+
+def make_sheet_name(name: str, taken: set) -> str:
+    """
+    生成合法且不重复的sheet名称（去除非法字符、截断到31个字符，重名时追加 _2、_3 ...）
+    
+    Args:
+        name: 期望的名称
+        taken: 已使用的名称（小写），生成的名称会加入其中
+        
+    Returns:
+        sheet名称
+    """
+    base = INVALID_SHEET_CHARS.sub('_', name).strip("'") or '空'
+    candidate = base[:SHEET_NAME_MAX_LENGTH]
+    index = 1
+    while candidate.lower() in taken:
+        index += 1
+        suffix = f"_{index}"
+        candidate = base[:SHEET_NAME_MAX_LENGTH - len(suffix)] + suffix
+    taken.add(candidate.lower())
+    return candidate
+
+
+def normalize_value(value):
+    """
+    统一拆分值的类型，使流式扫描、列式缓存和 pandas 读取得到相同的值
+    
+    含空值的整数列会被 pandas 读成 float64（1 → 1.0），扫描器则得到 int，
+    因此整数值的浮点数一律转为 int
+    
+    Args:
+        value: 拆分值
+        
+    Returns:
+        规范化后的值
+    """
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def sort_values(values) -> list:
+    """
+    排序拆分值（数字在前，其余按文本排序，避免数字、文本、日期混合时无法比较）
+    
+    Args:
+        values: 拆分值集合
+        
+    Returns:
+        排序后的列表
+    """
+    def key(value):
+        if isinstance(value, (int, float)):
+            return (0, value, '')
+        return (1, 0, str(value))
+    return sorted(values, key=key)
 
 
 class ExcelSplitter:
     """Excel文件拆分器"""
     
-    def __init__(self, input_file: str, split_column: str, output_dir: str = "output"):
+    def __init__(self, input_file: str, split_column: str, output_dir: str = "output",
+                 include_sheets: Optional[List[str]] = None,
+                 exclude_sheets: Optional[List[str]] = None):
         """
         初始化拆分器
         
@@ -22,27 +99,37 @@ class ExcelSplitter:
             input_file: 输入的Excel文件路径
             split_column: 用于拆分的列名（如"商务组别"）
             output_dir: 输出目录路径
+            include_sheets: 只处理这些Sheet（名称或通配符），默认全部
+            exclude_sheets: 跳过这些Sheet（名称或通配符）
         """
         self.input_file = input_file
         self.split_column = split_column
         self.output_dir = output_dir
+        self.include_sheets = include_sheets
+        self.exclude_sheets = exclude_sheets
         
         # 创建输出目录
         Path(output_dir).mkdir(parents=True, exist_ok=True)
         
-    def read_all_sheets(self) -> Dict[str, pd.DataFrame]:
+    def read_all_sheets(self, reporter: Optional[ProgressReporter] = None) -> Dict[str, pd.DataFrame]:
         """
-        读取Excel文件中的所有sheet
+        读取Excel文件中所有选中的sheet（未选中的sheet不会被解析，有列式缓存时直接读取缓存）
         
+        Args:
+            reporter: 进度上报器，每开始读取一个sheet上报一次
+            
         Returns:
             字典，key为sheet名称，value为DataFrame
         """
-        excel_file = pd.ExcelFile(self.input_file)
         sheets = {}
         
-        for sheet_name in excel_file.sheet_names:
-            df = pd.read_excel(self.input_file, sheet_name=sheet_name)
-            sheets[sheet_name] = df
+        with open_workbook(self.input_file) as excel_file:
+            selected = select_sheets(excel_file.sheet_names,
+                                     self.include_sheets, self.exclude_sheets)
+            for sheet_name in selected:
+                if reporter:
+                    reporter.emit('sheet_started', sheet=sheet_name)
+                sheets[sheet_name] = excel_file.parse(sheet_name)
             
         return sheets
     
@@ -62,50 +149,105 @@ class ExcelSplitter:
             if self.split_column in df.columns:
                 # 去除空值并添加到集合
                 values = df[self.split_column].dropna().unique()
-                all_values.update(values)
+                all_values.update(normalize_value(value) for value in values)
             else:
                 print(f"警告: Sheet '{sheet_name}' 中未找到列 '{self.split_column}'")
         
-        return sorted(list(all_values))
+        return sort_values(all_values)
     
-    def copy_sheet_formatting(self, source_wb, source_sheet_name: str, 
-                            target_wb, target_sheet_name: str):
+    def count_values(self, sample_rows: Optional[int] = None) -> Dict[str, dict]:
         """
-        复制sheet的格式（尽可能保留原始格式）
+        统计每个sheet中各拆分值的行数（用于预览，只读取拆分列）
+        
+        每个sheet依次尝试：从列式缓存只读取拆分列 → 流式扫描 .xlsx 的XML → 完整读取该sheet
         
         Args:
-            source_wb: 源工作簿
-            source_sheet_name: 源sheet名称
-            target_wb: 目标工作簿
-            target_sheet_name: 目标sheet名称
-        """
-        try:
-            source_ws = source_wb[source_sheet_name]
-            target_ws = target_wb[target_sheet_name]
+            sample_rows: 每个sheet只统计前若干行并按比例估算，为空时精确统计
             
-            # 复制列宽
-            for col in source_ws.column_dimensions:
-                if col in source_ws.column_dimensions:
-                    target_ws.column_dimensions[col].width = source_ws.column_dimensions[col].width
-            
-            # 复制行高
-            for row in source_ws.row_dimensions:
-                if row in source_ws.row_dimensions:
-                    target_ws.row_dimensions[row].height = source_ws.row_dimensions[row].height
+        Returns:
+            字典，key为sheet名称，value为 {'counts': {拆分值: 行数}, 'approximate': 是否为估算}，
+            不包含拆分列的sheet不会出现在结果中
+        """
+        results = {}
+        scanner = None
+        scanner_tried = False
+        
+        with open_workbook(self.input_file) as workbook:
+            try:
+                if not workbook.cached:
+                    # 没有缓存时用扫描器读取sheet名称，避免 pandas 预先加载共享字符串
+                    scanner_tried = True
+                    try:
+                        scanner = XlsxKeyScanner(self.input_file)
+                    except ScanUnsupported:
+                        pass
+                sheet_names = scanner.worksheet_names if scanner else workbook.sheet_names
+                
+                for sheet_name in select_sheets(sheet_names, self.include_sheets, self.exclude_sheets):
+                    df = workbook.read_columns(sheet_name, [self.split_column])
+                    # 有缓存但该sheet转码失败时，同样先尝试流式扫描
+                    if df is None and not scanner_tried:
+                        scanner_tried = True
+                        try:
+                            scanner = XlsxKeyScanner(self.input_file)
+                        except ScanUnsupported:
+                            pass
                     
-        except Exception as e:
-            print(f"复制格式时出错: {str(e)}")
+                    result = self._count_sheet_values(workbook, scanner, sheet_name, df, sample_rows)
+                    if result is None:
+                        print(f"警告: Sheet '{sheet_name}' 中未找到列 '{self.split_column}'")
+                    else:
+                        results[sheet_name] = result
+            finally:
+                if scanner:
+                    scanner.close()
+        
+        return results
     
-    def split_and_save(self) -> Dict[str, str]:
+    def _count_sheet_values(self, workbook, scanner: Optional[XlsxKeyScanner], sheet_name: str,
+                            df: Optional[pd.DataFrame], sample_rows: Optional[int]) -> Optional[dict]:
+        """统计单个sheet中各拆分值的行数（df 为从缓存读取的拆分列），没有拆分列时返回 None"""
+        if df is None and scanner is not None:
+            try:
+                return scanner.count_values(sheet_name, self.split_column, sample_rows)
+            except ScanUnsupported as e:
+                print(f"Sheet '{sheet_name}' 无法流式扫描，改为完整读取: {str(e)}")
+        
+        if df is None:
+            df = workbook.parse(sheet_name)
+        if self.split_column not in df.columns:
+            return None
+        
+        column = df[self.split_column]
+        scale = 1
+        if sample_rows and len(column) > sample_rows:
+            scale = len(column) / sample_rows
+            column = column.iloc[:sample_rows]
+        
+        counts = {}
+        for value, count in column.dropna().value_counts().items():
+            value = normalize_value(value)
+            counts[value] = counts.get(value, 0) + round(count * scale)
+        return {
+            'counts': counts,
+            'approximate': scale != 1
+        }
+    
+    def split_and_save(self, progress: Optional[Callable[[dict], None]] = None) -> Dict[str, str]:
         """
         执行拆分并保存文件
         
+        Args:
+            progress: 进度回调，接收事件字典（sheet_started / rows_processed / file_written）
+        
         Returns:
             字典，key为拆分值，value为生成的文件路径
         """
+        reporter = ProgressReporter(progress)
+        
         # 读取所有sheet
         print(f"正在读取文件: {self.input_file}")
-        sheets = self.read_all_sheets()
+        sheets = self.read_all_sheets(reporter)
         print(f"共找到 {len(sheets)} 个sheet")
         
         # 获取唯一值
@@ -115,11 +257,11 @@ class ExcelSplitter:
         if not unique_values:
             raise ValueError(f"未找到可用于拆分的数据。请检查列名 '{self.split_column}' 是否正确。")
         
-        # 加载原始工作簿用于复制格式
-        try:
-            source_wb = openpyxl.load_workbook(self.input_file)
-        except:
-            source_wb = None
+        # 以需要写出的总行数作为进度基准
+        reporter.set_total(sum(len(df) for df in sheets.values() if self.split_column in df.columns))
+        
+        # 只读取选中sheet的列宽和标题行行高，不用 openpyxl 加载整个源工作簿
+        layouts = sheet_layouts(self.input_file, sheets.keys())
         
         # 为每个唯一值创建新的Excel文件
         output_files = {}
@@ -131,45 +273,114 @@ class ExcelSplitter:
             
             print(f"正在创建文件: {safe_filename}.xlsx")
             
-            # 创建新的Excel写入器
-            with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-                sheet_written = False
-                
-                # 遍历所有sheet
-                for sheet_name, df in sheets.items():
-                    if self.split_column in df.columns:
-                        # 筛选当前值的数据
-                        filtered_df = df[df[self.split_column] == value]
-                        
-                        if not filtered_df.empty:
-                            # 写入数据
-                            filtered_df.to_excel(writer, sheet_name=sheet_name, index=False)
-                            sheet_written = True
-                            print(f"  - Sheet '{sheet_name}': {len(filtered_df)} 行数据")
-                
-                if sheet_written:
-                    # 尝试复制格式
-                    if source_wb:
-                        for sheet_name in sheets.keys():
-                            if sheet_name in writer.book.sheetnames:
-                                try:
-                                    self.copy_sheet_formatting(
-                                        source_wb, sheet_name,
-                                        writer.book, sheet_name
-                                    )
-                                except:
-                                    pass
+            # write-only 工作簿逐行流式写出
+            wb = openpyxl.Workbook(write_only=True)
+            sheet_written = False
+            
+            # 遍历所有sheet
+            for sheet_name, df in sheets.items():
+                if self.split_column in df.columns:
+                    # 筛选当前值的数据
+                    filtered_df = df[df[self.split_column] == value]
+                    
+                    if not filtered_df.empty:
+                        # 写入数据并复制列宽、标题行行高（超过Excel行数上限时自动续写到新的sheet）
+                        RollingSheetWriter(wb, sheet_name, reserved=sheets.keys(),
+                                           **layouts.get(sheet_name, {})).append(filtered_df)
+                        sheet_written = True
+                        print(f"  - Sheet '{sheet_name}': {len(filtered_df)} 行数据")
+                        reporter.advance(rows=len(filtered_df), done=len(filtered_df))
             
+            # 没有写入任何sheet时不生成文件
             if sheet_written:
+                wb.save(output_file)
                 output_files[value] = output_file
                 print(f"✓ 成功创建: {safe_filename}.xlsx")
-            else:
-                # 如果没有写入任何sheet，删除空文件
-                if os.path.exists(output_file):
-                    os.remove(output_file)
+                reporter.emit('file_written', file=f"{safe_filename}.xlsx")
         
         return output_files
     
+    def split_to_workbook(self, output_file: Optional[str] = None, index_sheet: bool = True,
+                          progress: Optional[Callable[[dict], None]] = None) -> Dict[str, List[str]]:
+        """
+        拆分到单个工作簿，每个拆分值一个sheet
+        
+        源文件有多个包含拆分列的sheet时，sheet命名为"拆分值-原sheet名"。
+        所有sheet共用一套样式，以 write-only 模式逐行流式写出，
+        比生成N个独立文件再打包更小、更快
+        
+        Args:
+            output_file: 输出文件路径，默认为输出目录下的"拆分结果.xlsx"
+            index_sheet: 是否在最前面生成目录sheet（拆分值、sheet名称、行数，可点击跳转）
+            progress: 进度回调，接收事件字典（sheet_started / rows_processed / file_written）
+            
+        Returns:
+            字典，key为拆分值，value为该值对应的sheet名称列表
+        """
+        reporter = ProgressReporter(progress)
+        
+        print(f"正在读取文件: {self.input_file}")
+        sheets = self.read_all_sheets(reporter)
+        
+        unique_values = self.get_unique_values(sheets)
+        if not unique_values:
+            raise ValueError(f"未找到可用于拆分的数据。请检查列名 '{self.split_column}' 是否正确。")
+        
+        if output_file is None:
+            output_file = os.path.join(self.output_dir, "拆分结果.xlsx")
+        
+        # 每个sheet只分组一次，避免对每个拆分值重复做全表筛选
+        source_sheets = {name: df for name, df in sheets.items() if self.split_column in df.columns}
+        grouped = {name: {normalize_value(value): group
+                          for value, group in df.groupby(self.split_column, sort=False)}
+                   for name, df in source_sheets.items()}
+        reporter.set_total(sum(len(df) for df in source_sheets.values()))
+        
+        # 先确定所有sheet名称，目录sheet才能写在最前面
+        taken = {INDEX_SHEET_NAME.lower()} if index_sheet else set()
+        plan = []
+        for value in unique_values:
+            for sheet_name in source_sheets:
+                group = grouped[sheet_name].get(value)
+                if group is None:
+                    continue
+                title = f"{value}-{sheet_name}" if len(source_sheets) > 1 else str(value)
+                plan.append((value, sheet_name, make_sheet_name(title, taken), group))
+        
+        # 只从XML读取源sheet的列宽和标题行行高，不需要用 openpyxl 加载整个源工作簿
+        layouts = sheet_layouts(self.input_file, source_sheets.keys())
+        reserved = [INDEX_SHEET_NAME] + [target_name for _, _, target_name, _ in plan]
+        
+        wb = openpyxl.Workbook(write_only=True)
+        
+        if index_sheet:
+            index_ws = wb.create_sheet(INDEX_SHEET_NAME)
+            index_ws.append([self.split_column, 'Sheet', '行数'])
+            for value, sheet_name, target_name, group in plan:
+                link = WriteOnlyCell(index_ws, value=target_name)
+                # sheet名称中的单引号在引用中需要写成两个
+                quoted = target_name.replace("'", "''")
+                link.hyperlink = Hyperlink(ref='', location=f"'{quoted}'!A1")
+                link.style = 'Hyperlink'
+                index_ws.append([str(value), link, len(group)])
+        
+        result = {}
+        for value, sheet_name, target_name, group in plan:
+            # 超过Excel行数上限的分组续写到 名称_2、名称_3 ...
+            sheet_writer = RollingSheetWriter(wb, target_name, reserved=reserved,
+                                              **layouts.get(sheet_name, {}))
+            sheet_writer.append(group)
+            
+            result.setdefault(value, []).extend(sheet_writer.sheet_names)
+            print(f"  - Sheet '{target_name}': {len(group)} 行数据")
+            reporter.advance(rows=len(group), done=len(group))
+        
+        wb.save(output_file)
+        print(f"✓ 成功创建: {os.path.basename(output_file)}（{len(plan)} 个sheet）")
+        reporter.emit('file_written', file=os.path.basename(output_file))
+        
+        return result
+    
     def get_summary(self) -> str:
         """
         获取拆分摘要信息
@@ -202,6 +413,11 @@ def main():
     parser.add_argument('input_file', help='输入的Excel文件路径')
     parser.add_argument('split_column', help='用于拆分的列名（如"商务组别"）')
     parser.add_argument('--output-dir', '-o', default='output', help='输出目录（默认: output）')
+    parser.add_argument('--include-sheets', nargs='+', help='只处理这些Sheet，支持通配符（如 "明细*"）')
+    parser.add_argument('--exclude-sheets', nargs='+', help='跳过这些Sheet，支持通配符（如 "透视*"）')
+    parser.add_argument('--single-workbook', action='store_true',
+                        help='输出为单个工作簿，每个拆分值一个Sheet（默认每个值一个文件）')
+    parser.add_argument('--no-index', action='store_true', help='单工作簿模式下不生成目录Sheet')
     
     args = parser.parse_args()
     
@@ -209,7 +425,9 @@ def main():
     splitter = ExcelSplitter(
         input_file=args.input_file,
         split_column=args.split_column,
-        output_dir=args.output_dir
+        output_dir=args.output_dir,
+        include_sheets=args.include_sheets,
+        exclude_sheets=args.exclude_sheets
     )
     
     # 显示摘要
@@ -217,10 +435,17 @@ def main():
     
     # 执行拆分
     print("\n开始拆分...")
-    output_files = splitter.split_and_save()
-    
-    print(f"\n拆分完成！共生成 {len(output_files)} 个文件。")
-    print(f"文件保存在: {os.path.abspath(args.output_dir)}")
+    if args.single_workbook:
+        output_file = os.path.join(args.output_dir, "拆分结果.xlsx")
+        sheet_map = splitter.split_to_workbook(output_file, index_sheet=not args.no_index)
+        
+        print(f"\n拆分完成！共 {len(sheet_map)} 个拆分值。")
+        print(f"文件保存在: {os.path.abspath(output_file)}")
+    else:
+        output_files = splitter.split_and_save()
+        
+        print(f"\n拆分完成！共生成 {len(output_files)} 个文件。")
+        print(f"文件保存在: {os.path.abspath(args.output_dir)}")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,149 @@
+"""
+任务工作区
+为每个Web请求分配唯一的任务ID和独立的临时目录，结果通过原子重命名发布到输出目录，
+避免多进程/多线程并发时互相覆盖或删除对方的文件
+"""
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+
+# 临时目录放在输出目录内部，保证与发布目标在同一文件系统上，os.replace 才是原子的
+SCRATCH_DIRNAME = '.jobs'
+
+# 超过该时间仍未清理的临时目录视为孤儿（进程崩溃或被强制结束时遗留）
+ORPHAN_MAX_AGE = 60 * 60
+
+
+def new_job_id() -> str:
+    """
+    生成唯一的任务ID
+
+    Returns:
+        形如 20240101_120000_1a2b3c4d 的字符串，前缀便于人工排查，后缀保证唯一
+    """
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return f"{timestamp}_{uuid.uuid4().hex[:8]}"
+
+
+def unique_filename(filename: str, job_id: Optional[str] = None) -> str:
+    """
+    为上传文件生成不会冲突的保存名称
+
+    Args:
+        filename: 已经过 secure_filename 处理的文件名
+        job_id: 任务ID，不传则自动生成
+
+    Returns:
+        带任务ID前缀的文件名
+    """
+    return f"{job_id or new_job_id()}_{filename}"
+
+
+class JobWorkspace:
+    """单个任务的独立工作区"""
+
+    def __init__(self, output_root: str, job_id: Optional[str] = None):
+        """
+        初始化工作区并创建临时目录
+
+        Args:
+            output_root: 结果发布目录（如 outputs）
+            job_id: 任务ID，不传则自动生成
+        """
+        self.output_root = output_root
+        self.job_id = job_id or new_job_id()
+        self.scratch_dir = os.path.join(output_root, SCRATCH_DIRNAME, self.job_id)
+
+        Path(self.scratch_dir).mkdir(parents=True, exist_ok=False)
+
+    def __enter__(self) -> 'JobWorkspace':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.cleanup()
+
+    def path(self, *parts: str) -> str:
+        """
+        获取临时目录内的路径
+
+        Args:
+            parts: 相对路径片段
+
+        Returns:
+            拼接后的完整路径
+        """
+        return os.path.join(self.scratch_dir, *parts)
+
+    def publish(self, scratch_name: str, public_name: str) -> str:
+        """
+        将临时目录中已写完的文件原子地发布到输出目录
+
+        Args:
+            scratch_name: 临时目录内的文件名
+            public_name: 发布后的文件名
+
+        Returns:
+            发布后的文件名（用于拼接下载地址）
+        """
+        os.replace(self.path(scratch_name), os.path.join(self.output_root, public_name))
+        return public_name
+
+    def cleanup(self):
+        """删除临时目录（已发布的文件不受影响）"""
+        shutil.rmtree(self.scratch_dir, ignore_errors=True)
+
+
+def progress_file_path(output_root: str, progress_id: str) -> str:
+    """
+    获取任务进度文件路径（与临时目录放在一起，由 cleanup_orphans 统一清理）
+
+    Args:
+        output_root: 结果发布目录
+        progress_id: 前端生成的进度ID
+
+    Returns:
+        进度文件路径
+    """
+    scratch_root = os.path.join(output_root, SCRATCH_DIRNAME)
+    Path(scratch_root).mkdir(parents=True, exist_ok=True)
+    return os.path.join(scratch_root, f"{progress_id}.progress.json")
+
+
+def cleanup_orphans(output_root: str, max_age: int = ORPHAN_MAX_AGE) -> int:
+    """
+    清理遗留的孤儿临时目录和进度文件
+
+    只删除超过 max_age 秒未修改的条目，其他worker正在使用的工作区不会被误删
+
+    Args:
+        output_root: 结果发布目录
+        max_age: 最大保留秒数
+
+    Returns:
+        删除的条目数
+    """
+    scratch_root = os.path.join(output_root, SCRATCH_DIRNAME)
+    if not os.path.isdir(scratch_root):
+        return 0
+
+    removed = 0
+    cutoff = time.time() - max_age
+    for entry in os.scandir(scratch_root):
+        try:
+            if entry.stat(follow_symlinks=False).st_mtime >= cutoff:
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                os.remove(entry.path)
+            removed += 1
+        except FileNotFoundError:
+            # 其他worker同时在清理
+            continue
+
+    return removed
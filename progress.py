@@ -0,0 +1,117 @@
+"""
+进度事件
+拆分器和合并器通过 ProgressReporter 上报进度（开始处理Sheet、已处理行数、文件已写入、
+已压缩字节数），Web端把事件写入进度文件，由 Server-Sent Events 接口推送给浏览器
+"""
+import json
+import os
+import time
+from typing import Callable, Optional
+
+
+# 高频事件（行数、字节数）的最小上报间隔（秒）
+MIN_INTERVAL = 0.25
+
+# 结束事件，收到后前端停止监听
+TERMINAL_EVENTS = ('done', 'error')
+
+
+class ProgressReporter:
+    """
+    进度上报器
+
+    事件为字典，如 {'event': 'rows_processed', 'rows': 1200, 'progress': 0.35}，
+    progress 为 0~1 的完成比例（未知时为 None），前端据此计算吞吐量和剩余时间
+    """
+
+    def __init__(self, callback: Optional[Callable[[dict], None]] = None,
+                 min_interval: float = MIN_INTERVAL):
+        """
+        Args:
+            callback: 事件回调，为 None 时所有上报都是空操作
+            min_interval: 高频事件的最小上报间隔（秒）
+        """
+        self.callback = callback
+        self.min_interval = min_interval
+        self.rows = 0
+        self.done = 0
+        self.total = 0
+        self._last_sent = 0.0
+
+    def set_total(self, total: int):
+        """设置总工作量（行数或步数），用于计算完成比例"""
+        self.total = total
+
+    def _progress(self) -> Optional[float]:
+        if not self.total:
+            return None
+        return min(self.done / self.total, 1.0)
+
+    def emit(self, event: str, **data):
+        """
+        立即上报一个事件（用于开始处理Sheet、文件已写入等低频事件）
+
+        Args:
+            event: 事件类型
+            data: 附加字段
+        """
+        if self.callback is None:
+            return
+        payload = {'event': event, 'rows': self.rows, 'progress': self._progress()}
+        payload.update(data)
+        self._last_sent = time.monotonic()
+        self.callback(payload)
+
+    def advance(self, rows: int = 0, done: int = 0, event: str = 'rows_processed', **data):
+        """
+        累加进度，按 min_interval 限流上报（可以在循环中频繁调用）
+
+        Args:
+            rows: 新处理的行数
+            done: 新完成的工作量（与 set_total 的单位一致）
+            event: 事件类型
+            data: 附加字段
+        """
+        self.rows += rows
+        self.done += done
+        if self.callback is None:
+            return
+        if time.monotonic() - self._last_sent >= self.min_interval:
+            self.emit(event, **data)
+
+
+class ProgressFile:
+    """
+    把最新进度事件写入JSON文件的回调
+
+    多个worker之间共享进度只依赖文件系统，SSE接口读取同一个文件即可
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: 进度文件路径
+        """
+        self.path = path
+
+    def __call__(self, event: dict):
+        # 先写临时文件再替换，读取方不会读到写了一半的内容
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(event, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, self.path)
+
+    def read(self) -> Optional[str]:
+        """读取最新事件的JSON文本，文件不存在时返回 None"""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def remove(self):
+        """删除进度文件"""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
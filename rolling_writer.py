@@ -0,0 +1,136 @@
+"""
+分段写入Sheet
+单个Sheet最多 1,048,576 行（含标题行），数据超出时自动续写到 Sheet_2、Sheet_3 ...，
+每个分段都带标题行
+
+写入目标是 openpyxl 的 write-only 工作簿：每一行追加后直接流式写到临时文件，
+内存占用与总单元格数无关，不需要先把所有数据拼接成一个DataFrame
+"""
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
+
+
+# Excel单个Sheet的最大行数（含标题行）
+EXCEL_MAX_ROWS = 1048576
+
+# Excel Sheet名称的最大长度
+SHEET_NAME_MAX_LENGTH = 31
+
+# 与 pandas to_excel 的标题行样式一致
+HEADER_FONT = Font(bold=True)
+HEADER_BORDER = Border(left=Side(style='thin'), right=Side(style='thin'),
+                       top=Side(style='thin'), bottom=Side(style='thin'))
+HEADER_ALIGNMENT = Alignment(horizontal='center', vertical='top')
+
+
+def rollover_sheet_name(base_name: str, index: int) -> str:
+    """
+    生成第 index 个分段的Sheet名称（第1段使用原名称）
+
+    Args:
+        base_name: 原Sheet名称
+        index: 分段序号，从1开始
+
+    Returns:
+        不超过31个字符的Sheet名称
+    """
+    if index == 1:
+        return base_name[:SHEET_NAME_MAX_LENGTH]
+    suffix = f"_{index}"
+    return base_name[:SHEET_NAME_MAX_LENGTH - len(suffix)] + suffix
+
+
+class RollingSheetWriter:
+    """向 write-only 工作簿分段写入一个逻辑Sheet"""
+
+    def __init__(self, workbook: Workbook, sheet_name: str,
+                 reserved: Optional[Iterable[str]] = None,
+                 max_rows: int = EXCEL_MAX_ROWS,
+                 column_widths: Optional[Dict[str, float]] = None,
+                 header_height: Optional[float] = None):
+        """
+        Args:
+            workbook: 目标工作簿（write_only=True）
+            sheet_name: 原Sheet名称
+            reserved: 其他Sheet会用到的名称，分段命名时避开（不区分大小写）
+            max_rows: 每个Sheet的最大行数（含标题行）
+            column_widths: 每个分段都使用的列宽（key为列字母）
+            header_height: 每个分段标题行的行高
+        """
+        self.workbook = workbook
+        self.base_name = sheet_name
+        self.max_data_rows = max_rows - 1
+        self.column_widths = column_widths or {}
+        self.header_height = header_height
+        self.rows: Dict[str, int] = {}
+
+        self._reserved = {name.lower() for name in (reserved or []) if name != sheet_name}
+        self._index = 0
+        self._current = None
+        self._worksheet = None
+
+    @property
+    def sheet_names(self) -> List[str]:
+        """已写入的Sheet名称（按写入顺序）"""
+        return list(self.rows)
+
+    @property
+    def total_rows(self) -> int:
+        """已写入的数据行数（不含标题行）"""
+        return sum(self.rows.values())
+
+    def _open_next(self):
+        taken = self._reserved | {name.lower() for name in self.workbook.sheetnames}
+        while True:
+            self._index += 1
+            name = rollover_sheet_name(self.base_name, self._index)
+            if name.lower() not in taken:
+                break
+        self._current = name
+        self.rows[name] = 0
+        self._worksheet = self.workbook.create_sheet(name)
+
+        # write-only 模式下列宽和行高必须在写入数据前设置
+        for col, width in self.column_widths.items():
+            self._worksheet.column_dimensions[col].width = width
+        if self.header_height:
+            self._worksheet.row_dimensions[1].height = self.header_height
+
+        if self._index > 1:
+            print(f"  ↪ 超过Excel行数上限，续写到 Sheet '{name}'")
+
+    def _append_header(self, columns):
+        header = []
+        for value in columns:
+            cell = WriteOnlyCell(self._worksheet, value=value)
+            cell.font = HEADER_FONT
+            cell.border = HEADER_BORDER
+            cell.alignment = HEADER_ALIGNMENT
+            header.append(cell)
+        self._worksheet.append(header)
+
+    def append(self, df: pd.DataFrame):
+        """
+        追加数据，当前Sheet写满时自动切换到下一个分段
+
+        Args:
+            df: 要追加的数据，列顺序应与第一次追加时一致
+        """
+        offset = 0
+        while offset < len(df):
+            if self._current is None or self.rows[self._current] >= self.max_data_rows:
+                self._open_next()
+                self._append_header(df.columns)
+
+            chunk = df.iloc[offset:offset + self.max_data_rows - self.rows[self._current]]
+            # 空值写为空单元格，与 to_excel 一致
+            values = chunk.astype(object).where(chunk.notna(), None)
+            for row in values.itertuples(index=False, name=None):
+                self._worksheet.append(row)
+
+            self.rows[self._current] += len(chunk)
+            offset += len(chunk)
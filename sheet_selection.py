@@ -0,0 +1,36 @@
+"""
+Sheet选择工具
+按名称或通配符模式（如 "透视*"）筛选需要处理的Sheet，
+拆分器和合并器在读取数据之前调用，未选中的Sheet不会被解析
+"""
+from fnmatch import fnmatchcase
+from typing import Iterable, List, Optional
+
+
+def _matches(sheet_name: str, patterns: Iterable[str]) -> bool:
+    # Excel的Sheet名称不允许包含 * ? [ ]，所以精确名称和通配符可以统一用 fnmatch 处理
+    return any(fnmatchcase(sheet_name, pattern) for pattern in patterns)
+
+
+def select_sheets(sheet_names: Iterable[str],
+                  include: Optional[List[str]] = None,
+                  exclude: Optional[List[str]] = None) -> List[str]:
+    """
+    筛选Sheet名称，保持原有顺序
+
+    Args:
+        sheet_names: 工作簿中的全部Sheet名称
+        include: 只保留匹配的Sheet（名称或通配符），为空表示全部保留
+        exclude: 排除匹配的Sheet（名称或通配符），优先于 include
+
+    Returns:
+        选中的Sheet名称列表
+    """
+    selected = []
+    for sheet_name in sheet_names:
+        if include and not _matches(sheet_name, include):
+            continue
+        if exclude and _matches(sheet_name, exclude):
+            continue
+        selected.append(sheet_name)
+    return selected
@@ -0,0 +1,205 @@
+"""
+列式Sheet缓存
+每个Sheet第一次被读取时转码为 Arrow/Feather 文件（保存在上传文件旁的
+<文件名>.sheets/ 目录中），之后的预览、拆分、合并直接内存映射读取，
+不必每次重新解析 .xlsx/.xls；从未被读取的Sheet不会被转码
+
+pyarrow 是可选依赖：未安装 pyarrow 或某个Sheet无法转码（如同一列混合数字和文本）时，
+自动回退为读取Excel
+"""
+import json
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # pragma: no cover - pyarrow 是可选依赖
+    pa = None
+    feather = None
+
+
+SIDECAR_SUFFIX = '.sheets'
+MANIFEST_NAME = 'manifest.json'
+DATA_SUFFIX = '.feather'
+# 无法转码的Sheet留下的标记文件
+SKIP_SUFFIX = '.skip'
+
+
+def sidecar_dir(filepath: str) -> str:
+    """获取工作簿对应的缓存目录路径"""
+    return filepath + SIDECAR_SUFFIX
+
+
+def _source_signature(filepath: str) -> Dict[str, int]:
+    # 用大小和修改时间判断缓存是否仍然对应当前文件
+    stat = os.stat(filepath)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _load_manifest(filepath: str) -> Optional[dict]:
+    manifest_path = os.path.join(sidecar_dir(filepath), MANIFEST_NAME)
+    try:
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if manifest.get('source') != _source_signature(filepath):
+        # 源文件已变化，旧缓存全部作废
+        remove_sidecar(filepath)
+        return None
+    return manifest
+
+
+def _write_atomic(path: str, write):
+    # 每个写入方使用自己的临时文件，多个worker同时写同一个缓存也不会互相覆盖一半的内容
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def remove_sidecar(filepath: str):
+    """删除工作簿对应的缓存目录"""
+    shutil.rmtree(sidecar_dir(filepath), ignore_errors=True)
+
+
+class CachedWorkbook:
+    """
+    带缓存的工作簿读取器
+
+    接口与 pd.ExcelFile 一致（sheet_names / parse / close）。
+    某个Sheet第一次被读取时才转码为Feather文件，之后直接内存映射读取；
+    从未被读取的Sheet（如被筛选排除的透视表）不会产生任何开销
+    """
+
+    def __init__(self, filepath: str):
+        """
+        Args:
+            filepath: Excel文件路径
+        """
+        self.filepath = filepath
+        self._excel_file = None
+        self._sheet_names = None
+
+        manifest = _load_manifest(filepath) if pa is not None else None
+        self._cached = manifest is not None
+        if manifest:
+            self._sheet_names = manifest['sheet_names']
+
+    def __enter__(self) -> 'CachedWorkbook':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _excel(self) -> pd.ExcelFile:
+        if self._excel_file is None:
+            self._excel_file = pd.ExcelFile(self.filepath)
+        return self._excel_file
+
+    @property
+    def cached(self) -> bool:
+        """是否找到了有效的缓存清单（有清单时获取Sheet名称不需要打开Excel）"""
+        return self._cached
+
+    @property
+    def sheet_names(self) -> List[str]:
+        if self._sheet_names is None:
+            self._sheet_names = self._excel().sheet_names
+            if pa is not None:
+                self._write_manifest()
+        return self._sheet_names
+
+    def _write_manifest(self):
+        Path(sidecar_dir(self.filepath)).mkdir(parents=True, exist_ok=True)
+        manifest = {'source': _source_signature(self.filepath), 'sheet_names': self._sheet_names}
+
+        def write(path):
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False)
+
+        _write_atomic(os.path.join(sidecar_dir(self.filepath), MANIFEST_NAME), write)
+
+    def _sheet_path(self, sheet_name: str, suffix: str) -> Optional[str]:
+        if pa is None or sheet_name not in self.sheet_names:
+            return None
+        idx = self.sheet_names.index(sheet_name)
+        return os.path.join(sidecar_dir(self.filepath), f"{idx}{suffix}")
+
+    def _transcode(self, sheet_name: str, df: pd.DataFrame):
+        # Arrow 会把列名转成字符串，列名不全是字符串的Sheet保持读取Excel
+        data_path = self._sheet_path(sheet_name, DATA_SUFFIX)
+        skip_path = self._sheet_path(sheet_name, SKIP_SUFFIX)
+        try:
+            if not all(isinstance(col, str) for col in df.columns):
+                raise TypeError('列名不全是字符串')
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            # 不压缩，读取时才能直接内存映射
+            _write_atomic(data_path, lambda path: feather.write_feather(
+                table, path, compression='uncompressed'))
+        except (pa.ArrowException, ValueError, TypeError) as e:
+            print(f"Sheet '{sheet_name}' 无法转码，将直接读取Excel: {str(e)}")
+            # 记录失败，之后不再重复尝试转码
+            Path(skip_path).touch()
+        except OSError as e:
+            print(f"Sheet '{sheet_name}' 写入缓存失败: {str(e)}")
+
+    def parse(self, sheet_name: str) -> pd.DataFrame:
+        """
+        读取指定Sheet（第一次读取时转码为Feather缓存）
+
+        Args:
+            sheet_name: Sheet名称
+
+        Returns:
+            该Sheet的DataFrame
+        """
+        data_path = self._sheet_path(sheet_name, DATA_SUFFIX)
+        if data_path and os.path.exists(data_path):
+            return feather.read_table(data_path, memory_map=True).to_pandas()
+
+        df = self._excel().parse(sheet_name)
+        if data_path and not os.path.exists(self._sheet_path(sheet_name, SKIP_SUFFIX)):
+            self._transcode(sheet_name, df)
+        return df
+
+    def read_columns(self, sheet_name: str, columns: List) -> Optional[pd.DataFrame]:
+        """
+        只读取缓存中的指定列（不存在的列会被忽略）
+
+        Args:
+            sheet_name: Sheet名称
+            columns: 列名列表
+
+        Returns:
+            只包含这些列的DataFrame；该Sheet还没有缓存时返回 None
+        """
+        if not self._cached:
+            return None
+        data_path = self._sheet_path(sheet_name, DATA_SUFFIX)
+        if not data_path or not os.path.exists(data_path):
+            return None
+        with pa.memory_map(data_path) as source:
+            names = pa.ipc.open_file(source).schema.names
+        return feather.read_table(data_path, columns=[c for c in columns if c in names],
+                                  memory_map=True).to_pandas()
+
+    def close(self):
+        if self._excel_file is not None:
+            self._excel_file.close()
+            self._excel_file = None
+
+
+def open_workbook(filepath: str) -> CachedWorkbook:
+    """打开工作簿，优先使用列式缓存"""
+    return CachedWorkbook(filepath)
@@ -0,0 +1,129 @@
+"""
+excel_merger 测试
+用在临时目录中生成的小工作簿验证合并结果
+"""
+import os
+import sys
+
+import openpyxl
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from excel_merger import ExcelMerger
+
+
+def write_workbook(path, sheets):
+    """sheets: {Sheet名称: 行列表（第一行为标题）}"""
+    workbook = openpyxl.Workbook()
+    workbook.remove(workbook.active)
+    for name, rows in sheets.items():
+        worksheet = workbook.create_sheet(name)
+        for row in rows:
+            worksheet.append(row)
+    workbook.save(path)
+    return str(path)
+
+
+def test_merge_without_rows_raises(tmp_path):
+    files = [write_workbook(tmp_path / f'{i}.xlsx', {'数据': [['编号', '名称']]}) for i in range(2)]
+    output = tmp_path / 'merged.xlsx'
+    merger = ExcelMerger(files, str(output))
+
+    with pytest.raises(ValueError, match='没有可写入的数据'):
+        merger.merge_and_save()
+    assert not output.exists()
+
+
+@pytest.fixture
+def join_files(tmp_path):
+    """三个文件：两个有关键列 k（含空关键值），一个没有关键列"""
+    return [
+        write_workbook(tmp_path / 'j1.xlsx', {
+            'D': [['k', 'a'], [1, 'x'], [2, 'y'], [None, 'b1'], [None, 'b2']],
+            '说明': [['note'], ['hello']],
+        }),
+        write_workbook(tmp_path / 'j2.xlsx', {
+            'D': [['k', 'a'], [1, 'X'], [3, 'Z'], [None, 'c1'], [None, 'c2']],
+        }),
+        write_workbook(tmp_path / 'j3.xlsx', {
+            'D': [['other'], [5]],
+        }),
+    ]
+
+
+def frame_rows(df):
+    return df.astype(object).where(df.notna(), None).values.tolist()
+
+
+@pytest.mark.parametrize('how, expected', [
+    ('inner', [[1, 'x', 'X']]),
+    ('left', [[1, 'x', 'X'], [2, 'y', None],
+              [None, 'b1', None], [None, 'b2', None]]),
+    ('outer', [[1, 'x', 'X'], [2, 'y', None], [3, None, 'Z'],
+               [None, 'b1', None], [None, 'b2', None],
+               [None, None, 'c1'], [None, None, 'c2']]),
+])
+def test_join_sheets(join_files, how, expected):
+    merger = ExcelMerger(join_files, join_column='k', join_how=how)
+    result = merger.join_sheets('D', join_files)
+
+    # 与左表重名的列加上文件序号后缀，右表的空关键值行在 outer 连接中同样改名
+    assert result.columns.tolist() == ['k', 'a', 'a_2']
+    assert frame_rows(result) == expected
+    assert merger.blank_keys == {'D': [{'file': 'j1.xlsx', 'rows': 2}, {'file': 'j2.xlsx', 'rows': 2}]}
+    assert merger.skipped_files == {'D': [{'file': 'j3.xlsx', 'reason': "未找到关键列 'k'"}]}
+    assert merger.duplicate_keys == {}
+    assert merger.appended_sheets == []
+
+
+def test_join_reports_duplicate_keys(tmp_path):
+    files = [
+        write_workbook(tmp_path / 'left.xlsx', {'D': [['k', 'a'], [1, 'x'], [1, 'y'], [2, 'z']]}),
+        write_workbook(tmp_path / 'right.xlsx', {'D': [['k', 'b'], [1, 'p'], [2, 'q'], [2, 'r'], [2, 's']]}),
+    ]
+    merger = ExcelMerger(files, join_column='k', join_how='inner')
+    result = merger.join_sheets('D', files)
+
+    assert frame_rows(result) == [[1, 'x', 'p'], [1, 'y', 'p'],
+                                  [2, 'z', 'q'], [2, 'z', 'r'], [2, 'z', 's']]
+    assert merger.duplicate_keys == {'D': [
+        {'keys': 1, 'rows': 2, 'examples': ['1'], 'file': 'left.xlsx'},
+        {'keys': 1, 'rows': 3, 'examples': ['2'], 'file': 'right.xlsx'},
+    ]}
+    assert merger.blank_keys == {}
+    assert merger.skipped_files == {}
+
+
+def test_join_appends_sheets_without_key(join_files):
+    merger = ExcelMerger(join_files, join_column='k')
+    result = merger.join_sheets('说明', join_files[:1])
+
+    assert frame_rows(result) == [['hello']]
+    assert merger.appended_sheets == ['说明']
+    assert merger.skipped_files == {}
+
+
+def test_merge_falls_back_to_text_keys():
+    # 一个文件的关键列是数字（含空值时为浮点数），另一个是文本
+    merger = ExcelMerger([], join_column='k', join_how='outer')
+    left = pd.DataFrame({'k': [1.0, 2.0], 'a': ['x', 'y']})
+    right = pd.DataFrame({'k': ['1', 'B'], 'b': ['p', 'q']})
+
+    result = merger._merge(left, right, 2)
+
+    assert frame_rows(result) == [['1', 'x', 'p'], ['2', 'y', None], ['B', None, 'q']]
+
+
+def test_merge_and_save_with_join(join_files, tmp_path):
+    output = tmp_path / 'merged.xlsx'
+    merger = ExcelMerger(join_files, str(output), join_column='k', join_how='left')
+
+    assert merger.merge_and_save() == {'D': 4, '说明': 1}
+    assert merger.appended_sheets == ['说明']
+    assert list(merger.skipped_files) == ['D']
+    with pd.ExcelFile(output) as excel_file:
+        assert excel_file.sheet_names == ['D', '说明']
+        assert frame_rows(excel_file.parse('D')) == [[1, 'x', 'X'], [2, 'y', None],
+                                                     [None, 'b1', None], [None, 'b2', None]]
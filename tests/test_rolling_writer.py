@@ -0,0 +1,135 @@
+"""
+rolling_writer 测试
+用很小的 max_rows 验证分段续写、Sheet命名、标题行和列宽
+"""
+import os
+import sys
+
+import openpyxl
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rolling_writer import RollingSheetWriter, rollover_sheet_name
+
+
+# 每个Sheet 4 行 = 1 行标题 + 3 行数据
+MAX_ROWS = 4
+
+COLUMNS = ['编号', '商务组别', '备注']
+
+
+def make_frame(start, count):
+    return pd.DataFrame({
+        '编号': range(start, start + count),
+        '商务组别': [f'组{i}' for i in range(start, start + count)],
+        '备注': [None if i % 2 else f'备注{i}' for i in range(start, start + count)],
+    })
+
+
+def write_frames(path, sheet_name, frames, **kwargs):
+    workbook = openpyxl.Workbook(write_only=True)
+    writer = RollingSheetWriter(workbook, sheet_name, max_rows=MAX_ROWS, **kwargs)
+    for df in frames:
+        writer.append(df)
+    workbook.save(path)
+    return writer
+
+
+def sheet_rows(worksheet):
+    return [list(row) for row in worksheet.iter_rows(values_only=True)]
+
+
+@pytest.mark.parametrize('total, expected', [
+    (3, {'数据': 3}),
+    (4, {'数据': 3, '数据_2': 1}),
+    (6, {'数据': 3, '数据_2': 3}),
+    (7, {'数据': 3, '数据_2': 3, '数据_3': 1}),
+])
+def test_rolls_over_at_limit(tmp_path, total, expected):
+    path = tmp_path / 'out.xlsx'
+    # 分两次追加，第二次追加跨越分段边界
+    first = min(total, 2)
+    writer = write_frames(path, '数据', [make_frame(1, first), make_frame(1 + first, total - first)])
+
+    assert writer.rows == expected
+    assert writer.sheet_names == list(expected)
+    assert writer.total_rows == total
+
+    workbook = openpyxl.load_workbook(path)
+    assert workbook.sheetnames == list(expected)
+
+    values = []
+    for name in expected:
+        rows = sheet_rows(workbook[name])
+        assert len(rows) <= MAX_ROWS
+        assert len(rows) - 1 == expected[name]
+        values.extend(rows[1:])
+    expected_values = make_frame(1, total).astype(object)
+    assert values == expected_values.where(expected_values.notna(), None).values.tolist()
+
+
+def test_header_on_every_segment(tmp_path):
+    path = tmp_path / 'out.xlsx'
+    write_frames(path, '数据', [make_frame(1, 7)])
+
+    workbook = openpyxl.load_workbook(path)
+    assert len(workbook.sheetnames) == 3
+    for worksheet in workbook.worksheets:
+        assert [cell.value for cell in worksheet[1]] == COLUMNS
+        for cell in worksheet[1]:
+            assert cell.font.bold
+            assert cell.border.left.style == 'thin'
+            assert cell.alignment.horizontal == 'center'
+        # 数据行不带标题样式
+        assert not worksheet['A2'].font.bold
+
+
+def test_widths_on_every_segment(tmp_path):
+    path = tmp_path / 'out.xlsx'
+    write_frames(path, '数据', [make_frame(1, 7)],
+                 column_widths={'A': 33, 'C': 12}, header_height=30)
+
+    workbook = openpyxl.load_workbook(path)
+    for worksheet in workbook.worksheets:
+        assert worksheet.column_dimensions['A'].width == 33
+        assert worksheet.column_dimensions['C'].width == 12
+        assert worksheet.row_dimensions[1].height == 30
+
+
+def test_long_names_stay_within_31_characters(tmp_path):
+    base = '很长的Sheet名称' + 'X' * 30
+    assert rollover_sheet_name(base, 1) == base[:31]
+    assert rollover_sheet_name(base, 2) == base[:29] + '_2'
+    assert rollover_sheet_name(base, 10) == base[:28] + '_10'
+
+    path = tmp_path / 'out.xlsx'
+    writer = write_frames(path, base, [make_frame(1, 7)])
+
+    expected = [base[:31], base[:29] + '_2', base[:29] + '_3']
+    assert writer.sheet_names == expected
+    assert all(len(name) <= 31 for name in expected)
+    assert openpyxl.load_workbook(path).sheetnames == expected
+
+
+def test_skips_reserved_names(tmp_path):
+    path = tmp_path / 'out.xlsx'
+    workbook = openpyxl.Workbook(write_only=True)
+    # 工作簿中已有的Sheet和其他Sheet会用到的名称都要避开，且不区分大小写
+    workbook.create_sheet('data_3')
+    writer = RollingSheetWriter(workbook, 'Data', reserved=['DATA_2', 'Data'], max_rows=MAX_ROWS)
+    writer.append(make_frame(1, 7))
+    workbook.save(path)
+
+    assert writer.sheet_names == ['Data', 'Data_4', 'Data_5']
+    assert openpyxl.load_workbook(path).sheetnames == ['data_3', 'Data', 'Data_4', 'Data_5']
+
+
+def test_empty_frame_creates_no_sheet():
+    workbook = openpyxl.Workbook(write_only=True)
+    writer = RollingSheetWriter(workbook, '数据', max_rows=MAX_ROWS)
+    writer.append(make_frame(1, 0))
+
+    assert writer.rows == {}
+    assert workbook.sheetnames == []
@@ -0,0 +1,229 @@
+"""
+xlsx_scanner 测试
+用手工构造的带共享字符串表的工作簿（Excel保存的文件都使用共享字符串），
+在很小的 CHUNK_SIZE 下验证扫描结果与 pandas 完整读取一致
+"""
+import os
+import sys
+import zipfile
+from xml.sax.saxutils import escape
+
+import openpyxl
+import pandas as pd
+import pytest
+from openpyxl.chart import BarChart, Reference
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import xlsx_scanner
+from xlsx_scanner import XlsxKeyScanner, ScanUnsupported
+
+
+CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/sharedStrings.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>'
+    '</Types>'
+)
+
+ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="xl/workbook.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+    '</Relationships>'
+)
+
+WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="明细" sheetId="1" r:id="rId1"/></sheets></workbook>'
+)
+
+WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+    '<Relationship Id="rId2" Target="sharedStrings.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings"/>'
+    '</Relationships>'
+)
+
+
+def write_shared_strings_workbook(path, rows):
+    """按 rows（第一行为标题）写出所有文本都存放在共享字符串表中的工作簿"""
+    strings = []
+    index = {}
+    sheet_rows = []
+    for row_idx, row in enumerate(rows, start=1):
+        cells = []
+        for col_idx, value in enumerate(row):
+            ref = f"{chr(ord('A') + col_idx)}{row_idx}"
+            if value is None:
+                continue
+            if isinstance(value, str):
+                if value not in index:
+                    index[value] = len(strings)
+                    strings.append(value)
+                cells.append(f'<c r="{ref}" t="s"><v>{index[value]}</v></c>')
+            else:
+                cells.append(f'<c r="{ref}"><v>{value}</v></c>')
+        sheet_rows.append(f'<row r="{row_idx}">{"".join(cells)}</row>')
+
+    sheet = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        f'<dimension ref="A1:C{len(rows)}"/><sheetData>{"".join(sheet_rows)}</sheetData></worksheet>'
+    )
+    shared = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        f'count="{len(strings)}" uniqueCount="{len(strings)}">'
+        + ''.join(f'<si><t>{escape(s)}</t></si>' for s in strings)
+        + '</sst>'
+    )
+
+    with zipfile.ZipFile(path, 'w') as zf:
+        zf.writestr('[Content_Types].xml', CONTENT_TYPES)
+        zf.writestr('_rels/.rels', ROOT_RELS)
+        zf.writestr('xl/workbook.xml', WORKBOOK)
+        zf.writestr('xl/_rels/workbook.xml.rels', WORKBOOK_RELS)
+        zf.writestr('xl/worksheets/sheet1.xml', sheet)
+        zf.writestr('xl/sharedStrings.xml', shared)
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    rows = [['编号', '商务组别', '备注']]
+    for i in range(300):
+        rows.append([i, f'组{i % 7}', f'备注 {i} <{i % 3}>'])
+    path = str(tmp_path / 'shared.xlsx')
+    write_shared_strings_workbook(path, rows)
+    return path
+
+
+@pytest.mark.parametrize('chunk_size', [7, 37, 101, 997, xlsx_scanner.CHUNK_SIZE])
+def test_count_values_matches_pandas_for_any_chunk_size(workbook, monkeypatch, chunk_size):
+    monkeypatch.setattr(xlsx_scanner, 'CHUNK_SIZE', chunk_size)
+    expected = pd.read_excel(workbook, sheet_name='明细')
+
+    with XlsxKeyScanner(workbook) as scanner:
+        for column in ['商务组别', '备注']:
+            result = scanner.count_values('明细', column)
+            assert result['approximate'] is False
+            assert result['counts'] == expected[column].value_counts().to_dict()
+
+
+def test_missing_shared_string_raises_scan_unsupported(tmp_path):
+    path = str(tmp_path / 'broken.xlsx')
+    write_shared_strings_workbook(path, [['商务组别'], ['A'], ['B']])
+
+    # 删掉共享字符串表的最后一项，单元格引用的索引不存在
+    with zipfile.ZipFile(path) as zf:
+        parts = {name: zf.read(name) for name in zf.namelist()}
+    parts['xl/sharedStrings.xml'] = parts['xl/sharedStrings.xml'].replace(b'<si><t>B</t></si>', b'')
+    with zipfile.ZipFile(path, 'w') as zf:
+        for name, data in parts.items():
+            zf.writestr(name, data)
+
+    with XlsxKeyScanner(path) as scanner:
+        with pytest.raises(ScanUnsupported):
+            scanner.count_values('明细', '商务组别')
+
+
+def write_write_only_workbook(path, rows):
+    """openpyxl write-only 模式生成的工作簿没有 <dimension>（拆分、合并的输出文件都是这种格式）"""
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet('明细')
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+
+
+def test_sampling_without_dimension_estimates_from_bytes(tmp_path):
+    path = str(tmp_path / 'no_dimension.xlsx')
+    write_write_only_workbook(path, [['商务组别']] + [[f'组{i % 4}'] for i in range(20000)])
+    with zipfile.ZipFile(path) as zf:
+        assert b'<dimension' not in zf.read('xl/worksheets/sheet1.xml')
+
+    with XlsxKeyScanner(path) as scanner:
+        result = scanner.count_values('明细', '商务组别', sample_rows=1000)
+
+    assert result['approximate'] is True
+    assert sum(result['counts'].values()) == pytest.approx(20000, rel=0.05)
+    for count in result['counts'].values():
+        assert count == pytest.approx(5000, rel=0.05)
+
+
+def test_sampling_with_single_cell_dimension(workbook, tmp_path):
+    # ref="A1" 的 <dimension> 不能用来估算总行数
+    path = str(tmp_path / 'a1_dimension.xlsx')
+    with zipfile.ZipFile(workbook) as src, zipfile.ZipFile(path, 'w') as dst:
+        for name in src.namelist():
+            data = src.read(name)
+            if name == 'xl/worksheets/sheet1.xml':
+                data = data.replace(b'<dimension ref="A1:C301"/>', b'<dimension ref="A1"/>')
+            dst.writestr(name, data)
+
+    with XlsxKeyScanner(path) as scanner:
+        result = scanner.count_values('明细', '商务组别', sample_rows=70)
+
+    assert result['approximate'] is True
+    assert sum(result['counts'].values()) == pytest.approx(300, rel=0.1)
+
+
+def test_header_not_in_first_row_is_unsupported(tmp_path):
+    # pandas 总是把第1行作为标题行，扫描器不能改用第一个非空行
+    path = str(tmp_path / 'offset_header.xlsx')
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = '明细'
+    ws['B3'] = 'k'
+    ws['B4'] = 'a'
+    wb.save(path)
+
+    with XlsxKeyScanner(path) as scanner:
+        with pytest.raises(ScanUnsupported):
+            scanner.count_values('明细', 'k')
+
+
+def test_error_cells_are_blank(tmp_path):
+    path = str(tmp_path / 'errors.xlsx')
+    write_shared_strings_workbook(path, [['商务组别'], ['A'], ['B'], ['A']])
+    with zipfile.ZipFile(path) as zf:
+        parts = {name: zf.read(name) for name in zf.namelist()}
+    parts['xl/worksheets/sheet1.xml'] = parts['xl/worksheets/sheet1.xml'].replace(
+        b'<c r="A3" t="s"><v>2</v></c>', b'<c r="A3" t="e"><v>#DIV/0!</v></c>')
+    with zipfile.ZipFile(path, 'w') as zf:
+        for name, data in parts.items():
+            zf.writestr(name, data)
+
+    expected = pd.read_excel(path, sheet_name='明细')['商务组别'].value_counts().to_dict()
+    with XlsxKeyScanner(path) as scanner:
+        assert scanner.count_values('明细', '商务组别')['counts'] == expected == {'A': 2}
+
+
+def test_worksheet_names_skip_chartsheets(tmp_path):
+    path = str(tmp_path / 'chart.xlsx')
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = '明细'
+    for row in [['商务组别', '金额'], ['A', 1], ['B', 2]]:
+        ws.append(row)
+    chart = BarChart()
+    chart.add_data(Reference(ws, min_col=2, min_row=1, max_row=3))
+    wb.create_chartsheet('图表').add_chart(chart)
+    wb.save(path)
+
+    with XlsxKeyScanner(path) as scanner:
+        assert scanner.sheet_names == ['明细', '图表']
+        assert scanner.worksheet_names == pd.ExcelFile(path).sheet_names == ['明细']
@@ -0,0 +1,482 @@
+"""
+xlsx关键列扫描
+流式读取Sheet的XML，只解码指定列的单元格并统计每个值的行数，
+共享字符串在扫描结束后按需解析，适合对超大文件做拆分预览
+
+只支持 .xlsx（zip格式）；遇到日期等无法可靠解码的单元格时抛出 ScanUnsupported，
+调用方应回退为 pandas 完整读取
+"""
+import html
+import re
+import zipfile
+import posixpath
+import xml.etree.ElementTree as ET
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set
+
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+from openpyxl.utils import get_column_letter
+
+
+CHUNK_SIZE = 4 * 1024 * 1024
+
+# 与 pandas 默认的 na_values 保持一致，这些字符串在 read_excel 中会被视为空值
+NA_VALUES = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan',
+    '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+}
+
+_NS_REL = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+
+_ROW_RE = re.compile(rb'<(?:\w+:)?row\b[^>]*?(?:/>|>(.*?)</(?:\w+:)?row>)', re.S)
+_CELL_RE = re.compile(rb'<(?:\w+:)?c\b([^>]*?)(?:/>|>(.*?)</(?:\w+:)?c>)', re.S)
+_REF_RE = re.compile(rb'\br="([A-Z]+)(\d+)"')
+_TYPE_RE = re.compile(rb'\bt="(\w+)"')
+_STYLE_RE = re.compile(rb'\bs="(\d+)"')
+_VALUE_RE = re.compile(rb'<(?:\w+:)?v>(.*?)</(?:\w+:)?v>', re.S)
+_TEXT_RE = re.compile(rb'<(?:\w+:)?t\b[^>]*?(?:/>|>(.*?)</(?:\w+:)?t>)', re.S)
+_PHONETIC_RE = re.compile(rb'<(?:\w+:)?rPh\b.*?</(?:\w+:)?rPh>', re.S)
+_SI_RE = re.compile(rb'<(?:\w+:)?si\b[^>]*?(?:/>|>(.*?)</(?:\w+:)?si>)', re.S)
+_COL_RE = re.compile(rb'<(?:\w+:)?col\b([^>]*?)/?>')
+_COL_ATTR_RE = re.compile(rb'\b(min|max|width)="([\d.]+)"')
+_SHEET_DATA_RE = re.compile(rb'<(?:\w+:)?sheetData\b')
+_ROW_TAG_RE = re.compile(rb'<(?:\w+:)?row\b([^>]*)>')
+_ROW_HEIGHT_RE = re.compile(rb'\bht="([\d.]+)"')
+_CLOSE_PREFIX_RE = re.compile(rb'</(?:\w+:)?')
+_DIMENSION_RE = re.compile(rb'<(?:\w+:)?dimension\b[^>]*?\bref="[A-Z]*\d*:?[A-Z]*(\d+)"')
+# pandas 自动生成的列名（空标题、重复标题），无法从标题行直接对应
+_GENERATED_COLUMN_RE = re.compile(r'^Unnamed: \d+$|\.\d+$')
+
+
+class ScanUnsupported(Exception):
+    """文件或单元格无法用流式扫描可靠解码"""
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def _text(fragment: bytes) -> str:
+    # 富文本由多个 <t> 组成，注音 <rPh> 不属于单元格内容
+    fragment = _PHONETIC_RE.sub(b'', fragment)
+    return html.unescape(b''.join(m.group(1) or b'' for m in _TEXT_RE.finditer(fragment)).decode('utf-8'))
+
+
+def _last_close(buffer: bytes, name: bytes) -> int:
+    """返回最后一个结束标签 </name> 之后的位置，没有完整的结束标签时返回 -1"""
+    tail = name + b'>'
+    pos = len(buffer)
+    while True:
+        pos = buffer.rfind(tail, 0, pos)
+        if pos < 0:
+            return -1
+        # 跳过开始标签（如 <si>）和命名空间前缀不同的其他标签
+        start = buffer.rfind(b'<', 0, pos)
+        if start >= 0 and _CLOSE_PREFIX_RE.fullmatch(buffer, start, pos):
+            return pos + len(tail)
+
+
+def _number(text: str):
+    value = float(text)
+    return int(value) if value.is_integer() else value
+
+
+class XlsxKeyScanner:
+    """xlsx关键列扫描器"""
+
+    def __init__(self, filepath: str):
+        """
+        打开工作簿并读取Sheet目录（只解析 workbook.xml 和关系文件）
+
+        Args:
+            filepath: .xlsx 文件路径
+        """
+        if not zipfile.is_zipfile(filepath):
+            raise ScanUnsupported('不是 .xlsx 文件')
+
+        self.zip = zipfile.ZipFile(filepath)
+        self._date_styles = None
+        self._sheet_paths = {}
+        self._shared_strings_path = None
+        self._styles_path = None
+
+        try:
+            rels = ET.fromstring(self.zip.read('xl/_rels/workbook.xml.rels'))
+            workbook = ET.fromstring(self.zip.read('xl/workbook.xml'))
+        except (KeyError, ET.ParseError) as e:
+            self.zip.close()
+            raise ScanUnsupported(str(e))
+
+        targets = {}
+        for rel in rels:
+            target = rel.get('Target', '')
+            path = target.lstrip('/') if target.startswith('/') else posixpath.join('xl', target)
+            rel_type = rel.get('Type', '')
+            targets[rel.get('Id')] = (rel_type, path)
+            if rel_type.endswith('/sharedStrings'):
+                self._shared_strings_path = path
+            elif rel_type.endswith('/styles'):
+                self._styles_path = path
+
+        self.sheet_names = []
+        for element in workbook.iter():
+            if _local(element.tag) != 'sheet':
+                continue
+            name = element.get('name')
+            rel_type, path = targets.get(element.get(_NS_REL), ('', None))
+            self.sheet_names.append(name)
+            # 图表Sheet等非工作表没有数据可扫描
+            if rel_type.endswith('/worksheet'):
+                self._sheet_paths[name] = path
+
+    @property
+    def worksheet_names(self) -> List[str]:
+        """普通工作表的名称（不含图表Sheet，与 pandas 的 sheet_names 一致）"""
+        return [name for name in self.sheet_names if name in self._sheet_paths]
+
+    def __enter__(self) -> 'XlsxKeyScanner':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self.zip.close()
+
+    def _chunks(self, path: str):
+        with self.zip.open(path) as stream:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+
+    def _resolve_shared_strings(self, indices: Set[int]) -> Dict[int, str]:
+        # 只解析用到的共享字符串，到达最大索引后立即停止
+        if not indices:
+            return {}
+        if self._shared_strings_path is None:
+            raise ScanUnsupported('缺少共享字符串表')
+
+        resolved = {}
+        last = max(indices)
+        idx = 0
+        buffer = b''
+        for chunk in self._chunks(self._shared_strings_path):
+            buffer += chunk
+            # 只解析到最后一个完整的 </si>，未结束的部分留到下一块
+            end = _last_close(buffer, b'si')
+            if end < 0:
+                continue
+            for match in _SI_RE.finditer(buffer, 0, end):
+                if idx in indices:
+                    resolved[idx] = _text(match.group(1) or b'')
+                if idx >= last:
+                    return resolved
+                idx += 1
+            buffer = buffer[end:]
+        for match in _SI_RE.finditer(buffer):
+            if idx in indices:
+                resolved[idx] = _text(match.group(1) or b'')
+            idx += 1
+        return resolved
+
+    def _shared_strings(self, indices: Set[int]) -> Dict[int, str]:
+        # 共享字符串表与单元格引用不一致时交给调用方回退为完整读取
+        strings = self._resolve_shared_strings(indices)
+        missing = indices - strings.keys()
+        if missing:
+            raise ScanUnsupported(f'共享字符串索引 {min(missing)} 不存在')
+        return strings
+
+    def _is_date_style(self, style: int) -> bool:
+        if self._date_styles is None:
+            self._date_styles = set()
+            if self._styles_path:
+                root = ET.fromstring(self.zip.read(self._styles_path))
+                custom = {}
+                cell_xfs = []
+                for element in root.iter():
+                    tag = _local(element.tag)
+                    if tag == 'numFmt':
+                        custom[int(element.get('numFmtId'))] = element.get('formatCode', '')
+                    elif tag == 'cellXfs':
+                        cell_xfs = [int(xf.get('numFmtId', 0)) for xf in element]
+                for idx, fmt_id in enumerate(cell_xfs):
+                    fmt = custom.get(fmt_id, BUILTIN_FORMATS.get(fmt_id, ''))
+                    if is_date_format(fmt):
+                        self._date_styles.add(idx)
+        return style in self._date_styles
+
+    def _decode(self, attrs: bytes, body: Optional[bytes]):
+        """解码单元格，返回 (值, 共享字符串索引)，二者至多一个非空"""
+        if not body:
+            return None, None
+
+        type_match = _TYPE_RE.search(attrs)
+        cell_type = type_match.group(1) if type_match else b'n'
+
+        if cell_type == b'inlineStr':
+            return _text(body), None
+
+        value_match = _VALUE_RE.search(body)
+        if not value_match:
+            return None, None
+        raw = value_match.group(1)
+
+        if cell_type == b's':
+            if not raw.strip().isdigit():
+                raise ScanUnsupported('共享字符串索引无效')
+            return None, int(raw)
+        if cell_type == b'e':
+            # 错误值（#DIV/0!、#REF! 等）在 pandas 中读作空值
+            return None, None
+        if cell_type == b'str':
+            return html.unescape(raw.decode('utf-8')), None
+        if cell_type == b'b':
+            return raw.strip() == b'1', None
+        if cell_type == b'n':
+            style_match = _STYLE_RE.search(attrs)
+            if style_match and self._is_date_style(int(style_match.group(1))):
+                raise ScanUnsupported('关键列包含日期')
+            try:
+                return _number(raw.decode('ascii')), None
+            except ValueError:
+                raise ScanUnsupported('数值单元格无法解码')
+        raise ScanUnsupported(f'不支持的单元格类型: {cell_type.decode()}')
+
+    def _find_key_column(self, header: bytes, column) -> Optional[bytes]:
+        cells = {}
+        shared = {}
+        for match in _CELL_RE.finditer(header):
+            ref = _REF_RE.search(match.group(1))
+            if not ref:
+                raise ScanUnsupported('单元格缺少坐标')
+            value, index = self._decode(match.group(1), match.group(2))
+            if index is not None:
+                shared[ref.group(1)] = index
+            elif value is not None:
+                cells[ref.group(1)] = value
+
+        strings = self._shared_strings(set(shared.values()))
+        for letters, index in shared.items():
+            cells[letters] = strings[index]
+
+        for letters, value in cells.items():
+            if value == column:
+                return letters
+        return None
+
+    def column_widths(self, sheet_name: str) -> Dict[str, float]:
+        """
+        读取Sheet的列宽（只解析 <sheetData> 之前的 <cols> 部分）
+
+        Args:
+            sheet_name: Sheet名称
+
+        Returns:
+            字典，key为列字母，value为列宽
+        """
+        path = self._sheet_paths.get(sheet_name)
+        if path is None:
+            raise ScanUnsupported(f"Sheet '{sheet_name}' 不是普通工作表")
+
+        buffer = b''
+        for chunk in self._chunks(path):
+            buffer += chunk
+            data_start = _SHEET_DATA_RE.search(buffer)
+            if data_start:
+                buffer = buffer[:data_start.start()]
+                break
+
+        widths = {}
+        for match in _COL_RE.finditer(buffer):
+            attrs = dict(_COL_ATTR_RE.findall(match.group(1)))
+            if b'width' not in attrs or b'min' not in attrs:
+                continue
+            first = int(attrs[b'min'])
+            last = int(attrs.get(b'max', attrs[b'min']))
+            for idx in range(first, last + 1):
+                widths[get_column_letter(idx)] = float(attrs[b'width'])
+        return widths
+
+    def header_height(self, sheet_name: str) -> Optional[float]:
+        """
+        读取Sheet第1行（标题行）的行高（只解析到第一个 <row> 标签）
+
+        Args:
+            sheet_name: Sheet名称
+
+        Returns:
+            行高；没有设置时返回 None
+        """
+        path = self._sheet_paths.get(sheet_name)
+        if path is None:
+            raise ScanUnsupported(f"Sheet '{sheet_name}' 不是普通工作表")
+
+        buffer = b''
+        for chunk in self._chunks(path):
+            buffer += chunk
+            data_start = _SHEET_DATA_RE.search(buffer)
+            if not data_start:
+                continue
+            row = _ROW_TAG_RE.search(buffer, data_start.end())
+            if row:
+                if b' r="1"' not in row.group(0):
+                    return None
+                height = _ROW_HEIGHT_RE.search(row.group(1))
+                return float(height.group(1)) if height else None
+            if _last_close(buffer, b'sheetData') >= 0:
+                return None
+        return None
+
+    def count_values(self, sheet_name: str, column, sample_rows: Optional[int] = None) -> Optional[dict]:
+        """
+        统计指定列每个值的行数
+
+        Args:
+            sheet_name: Sheet名称
+            column: 关键列名（标题行中的值）
+            sample_rows: 只扫描前若干行数据并按比例估算，为空时完整扫描
+
+        Returns:
+            {'counts': {值: 行数}, 'approximate': 是否为估算}；Sheet中没有该列时返回 None
+        """
+        path = self._sheet_paths.get(sheet_name)
+        if path is None:
+            raise ScanUnsupported(f"Sheet '{sheet_name}' 不是普通工作表")
+
+        chunks = self._chunks(path)
+        buffer = b''
+        header_row = None
+        letters = None
+        last_row = None
+        # 已读取的XML字节数，用于在没有 <dimension> 时按字节比例估算
+        read_bytes = 0
+
+        # 定位标题行（第一个有内容的行）
+        for chunk in chunks:
+            buffer += chunk
+            read_bytes += len(chunk)
+            if last_row is None:
+                dimension = _DIMENSION_RE.search(buffer)
+                if dimension:
+                    last_row = int(dimension.group(1))
+            for match in _ROW_RE.finditer(buffer):
+                body = match.group(1)
+                if body and _CELL_RE.search(body) and any(
+                        self._decode(m.group(1), m.group(2)) != (None, None)
+                        for m in _CELL_RE.finditer(body)):
+                    ref = _REF_RE.search(body)
+                    if not ref:
+                        raise ScanUnsupported('单元格缺少坐标')
+                    header_row = int(ref.group(2))
+                    # pandas 总是把第1行作为标题行
+                    if header_row != 1:
+                        raise ScanUnsupported('第1行为空，标题行与 pandas 不一致')
+                    letters = self._find_key_column(body, column)
+                    buffer = buffer[match.end():]
+                    break
+            if header_row is not None:
+                break
+
+        if header_row is None:
+            return None
+        if letters is None:
+            if isinstance(column, str) and _GENERATED_COLUMN_RE.search(column):
+                raise ScanUnsupported('列名由 pandas 生成，无法从标题行定位')
+            return None
+
+        # 以坐标字面量开头的模式可以让正则引擎快速跳过其他列的单元格
+        key_re = re.compile(rb' r="' + letters + rb'(\d+)"([^>]*?)(?:/>|>(.*?)</(?:\w+:)?c>)', re.S)
+        raw_cells = Counter()
+        limit = header_row + sample_rows if sample_rows else None
+        data_start = read_bytes - len(buffer)
+        consumed = None
+
+        def scan(data: bytes) -> Optional[int]:
+            # 先按原始字节计数，扫描结束后每种取值只解码一次；超出抽样范围时返回停止位置
+            for match in key_re.finditer(data):
+                if limit is not None and int(match.group(1)) > limit:
+                    return match.start()
+                # 坐标之前可能还有其他属性（如 s="1"），从标签开头截取
+                start = data.rfind(b'<', 0, match.start())
+                raw_cells[(data[start:match.start()] + match.group(2), match.group(3))] += 1
+            return None
+
+        # 按行边界切分数据块，保证单元格不会被截断
+        pending = buffer
+        for chunk in chunks:
+            pending += chunk
+            read_bytes += len(chunk)
+            end = _last_close(pending, b'row')
+            if end < 0:
+                continue
+            stop = scan(pending[:end])
+            if stop is not None:
+                consumed = read_bytes - len(pending) + stop
+                break
+            pending = pending[end:]
+        else:
+            stop = scan(pending)
+            if stop is not None:
+                consumed = read_bytes - len(pending) + stop
+        truncated = consumed is not None
+
+        values = Counter()
+        shared = Counter()
+        for (attrs, body), count in raw_cells.items():
+            value, index = self._decode(attrs, body)
+            if index is not None:
+                shared[index] += count
+            elif value is not None:
+                values[value] += count
+
+        strings = self._shared_strings(set(shared))
+        for index, count in shared.items():
+            values[strings[index]] += count
+
+        counts = {value: count for value, count in values.items()
+                  if not (isinstance(value, str) and value in NA_VALUES)}
+
+        if truncated:
+            if last_row and last_row > limit:
+                # 按已扫描行数占总行数（来自 <dimension>）的比例放大
+                scale = (last_row - header_row) / sample_rows
+            else:
+                # 没有可用的 <dimension>（如 write-only 模式生成的文件），按已扫描字节占比放大
+                total_bytes = self.zip.getinfo(path).file_size
+                scale = (total_bytes - data_start) / max(consumed - data_start, 1)
+            counts = {value: round(count * scale) for value, count in counts.items()}
+
+        return {'counts': counts, 'approximate': truncated}
+
+
+def sheet_layouts(filepath: str, sheet_names: Iterable[str]) -> Dict[str, dict]:
+    """
+    读取指定Sheet的列宽和标题行行高，只解析这些Sheet的开头部分，不加载单元格数据
+
+    Args:
+        filepath: Excel文件路径
+        sheet_names: Sheet名称列表
+
+    Returns:
+        字典，key为Sheet名称，value为 {'column_widths': {列字母: 列宽}, 'header_height': 行高}；
+        .xls 等无法扫描的文件或Sheet不会出现在结果中
+    """
+    layouts = {}
+    try:
+        scanner = XlsxKeyScanner(filepath)
+    except ScanUnsupported:
+        return layouts
+
+    with scanner:
+        for sheet_name in sheet_names:
+            try:
+                layouts[sheet_name] = {
+                    'column_widths': scanner.column_widths(sheet_name),
+                    'header_height': scanner.header_height(sheet_name)
+                }
+            except ScanUnsupported:
+                continue
+    return layouts